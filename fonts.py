@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+"""
+Rejestracja czcionek Century Gothic dla ReportLab.
+Pliki TTF czytane są raz (w procesie głównym), a procesy robocze
+rejestrują czcionki z bajtów w pamięci – bez ponownego odczytu z dysku.
+"""
+
+import io
+from typing import Dict, Optional
+
+from reportlab.lib.fonts import addMapping
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+
+
+# Nazwa czcionki -> plik TTF
+FONT_FILES = {
+    'CenturyGothic': 'GOTHIC.TTF',
+    'CenturyGothic-Bold': 'GOTHICB.TTF',
+}
+
+# (zwykła, pogrubiona) – nazwy stałe niezależnie od dostępności plików,
+# więc style mogą je wskazywać jeszcze przed rejestracją
+FONT_NAMES = tuple(FONT_FILES)
+
+FALLBACK_FONTS = ('Helvetica', 'Helvetica-Bold')
+
+
+def read_font_bytes() -> Optional[Dict[str, bytes]]:
+    """Czyta pliki TTF do pamięci; None gdy któregoś brakuje."""
+    try:
+        font_bytes = {}
+        for name, path in FONT_FILES.items():
+            with open(path, 'rb') as f:
+                font_bytes[name] = f.read()
+        return font_bytes
+    except OSError:
+        return None
+
+
+def _register_fallback() -> None:
+    """Nazwy FONT_NAMES jako aliasy Helvetica (brak / błąd plików TTF)."""
+    for name, base in zip(FONT_NAMES, FALLBACK_FONTS):
+        pdfmetrics.registerFont(pdfmetrics.Font(name, base, 'WinAnsiEncoding'))
+        addMapping(name, 0, 0, name)
+
+
+def register(font_bytes: Optional[Dict[str, bytes]] = None) -> bool:
+    """
+    Rejestruje Century Gothic (raz na proces) – fallback na Helvetica pod
+    tymi samymi nazwami. Zwraca True gdy użyto plików TTF.
+
+    Args:
+        font_bytes: Zawartość plików TTF z read_font_bytes(); None = odczyt z dysku
+    """
+    if FONT_NAMES[1] in pdfmetrics.getRegisteredFontNames():
+        return isinstance(pdfmetrics.getFont(FONT_NAMES[1]), TTFont)
+    if font_bytes is None:
+        font_bytes = read_font_bytes()
+    if font_bytes:
+        try:
+            for name in FONT_FILES:
+                pdfmetrics.registerFont(TTFont(name, io.BytesIO(font_bytes[name])))
+            return True
+        except Exception:
+            pass
+    _register_fallback()
+    return False
@@ -5,23 +5,39 @@ Układ: Nagłówek + Podsumowanie (góra) + N dynamicznych tabel (dół).
 Konfiguracja tabel w plikach YAML (folder config/).
 """
 
+import argparse
+import contextlib
+import io
 import os
+import sys
+import re
 import csv
+import logging
+import pickle
+import queue
+import shutil
+import struct
+import threading
 import time
 from datetime import datetime
-from typing import List, Dict, Any
+from decimal import Decimal
+from functools import lru_cache
+from logging.handlers import QueueHandler, QueueListener
+from multiprocessing import shared_memory
+from typing import List, Dict, Any, Optional, BinaryIO
 from reportlab.platypus import KeepTogether
 
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import A4
 from reportlab.platypus import (
-    SimpleDocTemplate, Table, TableStyle, Spacer, Paragraph
+    SimpleDocTemplate, Table, TableStyle, Spacer, Paragraph, PageBreak
 )
 from reportlab.lib.units import cm
 from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
 from reportlab.lib.styles import ParagraphStyle
 
+import fonts
+
 
 # =========================================================================
 #  KONFIGURACJA
@@ -43,24 +59,37 @@ HANA_CONFIG = {
 
 BASE_OUTPUT_DIR = os.path.dirname(os.path.abspath(__file__))
 
+# Poziom komunikatów: INFO = etapy i podsumowania,
+# DEBUG = dodatkowo każda umowa / lokalizacja / zapytanie / PDF
+LOG_LEVEL = logging.INFO
+
 
 # =========================================================================
 #  CZCIONKI I KOLORY
 # =========================================================================
 
-try:
-    pdfmetrics.registerFont(TTFont('CenturyGothic', 'GOTHIC.TTF'))
-    pdfmetrics.registerFont(TTFont('CenturyGothic-Bold', 'GOTHICB.TTF'))
-    FONT_REGULAR = 'CenturyGothic'
-    FONT_BOLD = 'CenturyGothic-Bold'
-except Exception:
-    FONT_REGULAR = 'Helvetica'
-    FONT_BOLD = 'Helvetica-Bold'
+# Nazwy stałe – samą rejestrację (TTF albo alias Helvetica) robi init_fonts()
+# w procesie głównym / initializerze workera, nie import modułu
+FONT_REGULAR, FONT_BOLD = fonts.FONT_NAMES
+_fonts_ready = False
+
+
+def init_fonts(font_bytes: Optional[Dict[str, bytes]] = None) -> None:
+    """Rejestruje czcionki raz na proces – z bajtów TTF albo (None) z dysku."""
+    global _fonts_ready
+    if _fonts_ready:
+        return
+    if not fonts.register(font_bytes):
+        log.warning("  ⚠️  Brak Century Gothic – PDF-y z Helvetica")
+    _fonts_ready = True
 
 HEADER_BG_COLOR = colors.HexColor("#001E64")
 HEADER_TEXT_COLOR = colors.white
 ROW_ALT_COLOR = colors.HexColor("#FBFCFF")
 BORDER_COLOR = colors.HexColor("#EBF1FF")
+# Naprzemienne tła wierszy: białe wiersze pomijane (None) – strona jest biała,
+# ReportLab rysuje prostokąt tylko dla co drugiego wiersza
+_ALT_ROW_CYCLE = [None, ROW_ALT_COLOR]
 TEXT_COLOR = colors.HexColor("#001E64")
 
 
@@ -98,21 +127,48 @@ def get_hana_connection():
 #  NARZĘDZIA
 # =========================================================================
 
+# Komunikaty statusu – zamiast print(); po start_log_listener() zapis na
+# stdout robi wątek w tle, pętle generowania nie czekają na terminal
+log = logging.getLogger('raporty')
+
+
+def start_log_listener(level: int = LOG_LEVEL) -> QueueListener:
+    """
+    Podpina logger 'raporty' pod kolejkę obsługiwaną przez wątek w tle.
+    Zwraca listener – stop() na końcu programu wypisuje resztę kolejki.
+    """
+    log_queue = queue.SimpleQueue()
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    listener = QueueListener(log_queue, handler)
+    log.addHandler(QueueHandler(log_queue))
+    log.setLevel(level)
+    log.propagate = False
+    listener.start()
+    return listener
+
+
 class Timer:
     """Context manager do mierzenia czasu operacji."""
 
-    def __init__(self, name: str = "Operacja"):
+    def __init__(self, name: str = "Operacja", level: int = logging.INFO):
         self.name = name
+        self.level = level
         self.elapsed = 0.0
+        # Poziom wyłączony (np. DEBUG przy LOG_LEVEL=INFO) – bez formatowania
+        # i wywołań log w pętli raportów; sam pomiar czasu zostaje
+        self._enabled = log.isEnabledFor(level)
 
     def __enter__(self):
         self._start = time.perf_counter()
-        print(f"⏱️  {self.name}...")
+        if self._enabled:
+            log.log(self.level, f"⏱️  {self.name}...")
         return self
 
     def __exit__(self, *args):
         self.elapsed = time.perf_counter() - self._start
-        print(f"   → {self.elapsed:.3f}s")
+        if self._enabled:
+            log.log(self.level, f"   → {self.elapsed:.3f}s")
 
     def formatted(self) -> str:
         if self.elapsed < 1:
@@ -120,15 +176,36 @@ class Timer:
         return f"{self.elapsed:.2f}s"
 
 
+# (data, podfolder) → ścieżka; makedirs tylko raz na proces
+_folder_cache: Dict[tuple, str] = {}
+
+# Data przebiegu (nazwa folderu) – ustalana raz; workery dostają ją
+# z procesu głównego, więc PDF-y po północy trafiają do tego samego folderu
+_run_date: Optional[str] = None
+
+
+def run_date() -> str:
+    """Data bieżącego przebiegu 'RRRR-MM-DD' (liczona przy pierwszym użyciu)."""
+    global _run_date
+    if _run_date is None:
+        _run_date = datetime.now().strftime('%Y-%m-%d')
+    return _run_date
+
+
 def get_output_folder(subfolder: str = None) -> str:
     """Zwraca ścieżkę do folderu wyjściowego (tworzy jeśli brak)."""
-    today = datetime.now().strftime('%Y-%m-%d')
+    today = run_date()
+    key = (today, subfolder)
+    cached = _folder_cache.get(key)
+    if cached is not None:
+        return cached
     if subfolder:
         folder_name = f"{today}#{subfolder}"
     else:
         folder_name = today
     output_dir = os.path.join(BASE_OUTPUT_DIR, folder_name)
     os.makedirs(output_dir, exist_ok=True)
+    _folder_cache[key] = output_dir
     return output_dir
 
 
@@ -141,61 +218,129 @@ def get_output_path(filename: str, subfolder: str = None) -> str:
 #  FORMATOWANIE WARTOŚCI
 # =========================================================================
 
-def is_numeric(value) -> bool:
-    """Sprawdza czy wartość jest liczbą."""
-    try:
-        float(str(value).replace(',', '.').replace(' ', ''))
-        return True
-    except (ValueError, AttributeError):
-        return False
+# Liczba w formacie PL/EN: spacje jako separator tysięcy, ',' lub '.' dziesiętne
+_NUM_RE = re.compile(
+    r'\s*[-+]? *(?:\d[\d ]*(?:[.,][\d ]*)?|[.,] *\d[\d ]*)(?:[eE] *[-+]? *\d[\d ]*)?\s*'
+)
+
+# Tabele translate (jeden przebieg w C zamiast łańcucha .replace())
+_NUM_TRANS = str.maketrans({',': '.', ' ': None})
+_PLN_TRANS = str.maketrans({'_': ' ', '.': ','})
+
+# Typy liczbowe z kursora HANA – konwersja wprost, bez parsowania tekstu
+_NUMBER_TYPES = (int, float, Decimal)
+
+
+def _parse_number(value) -> Optional[float]:
+    """Parsuje wartość do float – None jeśli nie jest liczbą."""
+    if isinstance(value, str):
+        s = value
+    elif isinstance(value, _NUMBER_TYPES) and not isinstance(value, bool):
+        return float(value)
+    else:
+        s = str(value)
+    if _NUM_RE.fullmatch(s) is None:
+        return None
+    return float(s.translate(_NUM_TRANS))
+
+
+def _currency_text(num: float) -> str:
+    """Sformatowana kwota PLN dla już sparsowanej liczby."""
+    return f"{num:_.2f}".translate(_PLN_TRANS) + " zł"
+
+
+def _percentage_text(num: float) -> str:
+    """Sformatowany procent dla już sparsowanej liczby."""
+    return f"{num:.2f}%"
 
 
 def format_as_currency(value) -> str:
     """Formatuje wartość jako walutę PLN (np. '1 234,56 zł')."""
-    try:
-        num = float(str(value).replace(',', '.').replace(' ', ''))
-        return f"{num:,.2f}".replace(',', ' ').replace('.', ',') + " zł"
-    except (ValueError, AttributeError):
-        return str(value)
+    num = _parse_number(value)
+    return _currency_text(num) if num is not None else str(value)
 
 
 def format_as_percentage(value) -> str:
     """Formatuje wartość jako procent."""
-    try:
-        num = float(str(value).replace(',', '.').replace(' ', ''))
-        return f"{num:.2f}%"
-    except (ValueError, AttributeError):
-        return str(value)
-
-
-def calculate_column_sum(data: List[List[str]], col_index: int) -> str:
-    """Oblicza sumę wartości w kolumnie."""
-    total = 0.0
-    has_numbers = False
-    for row in data:
-        if col_index < len(row) and is_numeric(row[col_index]):
-            total += float(str(row[col_index]).replace(',', '.').replace(' ', ''))
-            has_numbers = True
-    return str(total) if has_numbers else ''
-
-
-def calculate_column_max(data: List[List[str]], col_index: int) -> str:
-    """Oblicza MAX wartości w kolumnie (dla procentów)."""
-    max_val = None
-    for row in data:
-        if col_index < len(row) and is_numeric(row[col_index]):
-            val = float(str(row[col_index]).replace(',', '.').replace(' ', ''))
-            if max_val is None or val > max_val:
-                max_val = val
-    return str(max_val) if max_val is not None else ''
+    num = _parse_number(value)
+    return _percentage_text(num) if num is not None else str(value)
+
+
+def _format_currency_batch(values: List[Optional[float]]) -> List[Optional[str]]:
+    """Formatuje całą sparsowaną kolumnę jako PLN (None = nie-liczba)."""
+    return [None if v is None else _currency_text(v) for v in values]
+
+
+def _format_percentage_batch(values: List[Optional[float]]) -> List[Optional[str]]:
+    """Formatuje całą sparsowaną kolumnę jako procent (None = nie-liczba)."""
+    return [None if v is None else _percentage_text(v) for v in values]
+
+
+def _parse_column(data: List[List[str]], col_index: int) -> List[Optional[float]]:
+    """
+    Parsuje kolumnę RAZ – wynik współdzielony przez formatowanie komórek
+    i wiersz SUMA (zamiast osobnego parsowania w każdym przebiegu).
+    """
+    return [
+        _parse_number(row[col_index]) if col_index < len(row) else None
+        for row in data
+    ]
+
+
+def _column_stats(parsed: Dict[int, List[Optional[float]]]) -> Dict[int, tuple]:
+    """
+    Statystyki kolumn w jednym przebiegu: {kolumna: (suma, max, czy_liczby)}.
+    Wiersz SUMA korzysta z nich zamiast osobnego skanu dla sumy i MAX.
+    """
+    stats = {}
+    for ci, values in parsed.items():
+        total = 0.0
+        col_max = None
+        for v in values:
+            if v is not None:
+                total += v
+                if col_max is None or v > col_max:
+                    col_max = v
+        stats[ci] = (total, col_max, col_max is not None)
+    return stats
+
+
+def _compute_totals(parsed: Dict[int, List[Optional[float]]], num_cols: int,
+                    currency_columns: List[int],
+                    currency_columns_2: List[int],
+                    percentage_columns: List[int]) -> List[str]:
+    """
+    Teksty wiersza SUMA dla kolumn 1..num_cols-1 ('' = pusta komórka):
+    procenty → MAX, waluta → suma PLN, reszta → suma; currency_2 bez sumy.
+    Statystyki liczone jednym przebiegiem tylko dla potrzebnych kolumn.
+    """
+    stats = _column_stats({
+        ci: parsed[ci] for ci in range(1, num_cols) if ci not in currency_columns_2
+    })
+    totals = []
+    for ci in range(1, num_cols):
+        if ci in currency_columns_2:
+            totals.append('')
+            continue
+        col_sum, col_max, has_num = stats[ci]
+        if not has_num:
+            totals.append('')
+        elif ci in percentage_columns:
+            totals.append(_percentage_text(col_max))
+        elif ci in currency_columns:
+            totals.append(_currency_text(col_sum))
+        else:
+            totals.append(str(col_sum))
+    return totals
 
 
 # =========================================================================
 #  STYLE TABEL
 # =========================================================================
 
+@lru_cache(maxsize=1)
 def get_summary_table_style() -> TableStyle:
-    """Styl dla tabeli podsumowania."""
+    """Styl dla tabeli podsumowania (stały – cache'owany, nie modyfikuj wyniku)."""
     return TableStyle([
         ('BACKGROUND', (0, 0), (-1, 0), HEADER_BG_COLOR),
         ('TEXTCOLOR', (0, 0), (-1, 0), HEADER_TEXT_COLOR),
@@ -203,7 +348,7 @@ def get_summary_table_style() -> TableStyle:
         ('FONTSIZE', (0, 0), (-1, 0), 6.5),
         ('ALIGN', (0, 0), (-1, 0), 'LEFT'),
         ('SPAN', (0, 0), (-1, 0)),
-        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, ROW_ALT_COLOR]),
+        ('ROWBACKGROUNDS', (0, 1), (-1, -1), _ALT_ROW_CYCLE),
         ('TEXTCOLOR', (0, 1), (0, -1), TEXT_COLOR),
         ('FONTNAME', (0, 1), (0, -1), FONT_BOLD),
         ('FONTSIZE', (0, 1), (0, -1), 5.5),
@@ -222,8 +367,52 @@ def get_summary_table_style() -> TableStyle:
     ])
 
 
-def get_large_table_style(has_total_row: bool = False, num_cols: int = 5) -> TableStyle:
-    """Styl dla dużych tabel danych – dynamiczny rozmiar czcionki."""
+def _cell_padding(num_cols: int) -> int:
+    """Poziomy padding komórek dużej tabeli (LEFT/RIGHTPADDING)."""
+    return 2 if num_cols > 8 else 3
+
+
+def _cell_font_sizes(num_cols: int) -> tuple:
+    """Rozmiar czcionki (nagłówek, dane) komórek tabeli wg liczby kolumn."""
+    if num_cols <= 5:
+        return 7, 6.5
+    if num_cols <= 8:
+        return 6.5, 6
+    return 5.5, 5.5
+
+
+# Komendy niezależne od kształtu tabeli: tytuł (wiersz 0), nagłówki (wiersz 1),
+# obramowanie i pionowe paddingi
+_LARGE_TITLE_FS, _LARGE_HEADER_FS = 7, 5.5
+_BASE_LARGE_CMDS = [
+    ('BACKGROUND', (0, 0), (-1, 0), HEADER_BG_COLOR),
+    ('TEXTCOLOR', (0, 0), (-1, 0), HEADER_TEXT_COLOR),
+    ('FONTNAME', (0, 0), (-1, 0), FONT_BOLD),
+    ('FONTSIZE', (0, 0), (-1, 0), _LARGE_TITLE_FS),
+    ('ALIGN', (0, 0), (-1, 0), 'LEFT'),
+    ('SPAN', (0, 0), (-1, 0)),
+    ('BACKGROUND', (0, 1), (-1, 1), colors.HexColor("#F7F9FF")),
+    ('TEXTCOLOR', (0, 1), (-1, 1), TEXT_COLOR),
+    ('FONTNAME', (0, 1), (-1, 1), FONT_BOLD),
+    ('FONTSIZE', (0, 1), (-1, 1), _LARGE_HEADER_FS),
+    ('ALIGN', (0, 1), (-1, 1), 'CENTER'),
+    ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+    ('BOX', (0, 0), (-1, -1), 0.5, BORDER_COLOR),
+    ('TOPPADDING', (0, 0), (-1, -1), 2),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 2),
+]
+
+
+@lru_cache(maxsize=32)
+def get_large_table_style(has_total_row: bool = False, num_cols: int = 5,
+                          has_data: bool = True,
+                          left_cols: tuple = ()) -> TableStyle:
+    """
+    Styl dla dużych tabel danych – dynamiczny rozmiar czcionki.
+    Cache'owany per kształt (has_total_row, num_cols, has_data, left_cols)
+    – nie modyfikuj wyniku. left_cols = kolumny tekstowe (zwykłe stringi
+    wyrównane do lewej).
+    """
     # Mniej kolumn → większa czcionka; 11 kolumn → mniejsza
     # if num_cols <= 5:
     #     title_fs, header_fs, data_fs = 8, 7, 6.5
@@ -231,35 +420,24 @@ def get_large_table_style(has_total_row: bool = False, num_cols: int = 5) -> Tab
     #     title_fs, header_fs, data_fs = 7, 6.5, 6
     # else:
     #     title_fs, header_fs, data_fs = 6.5, 5.5, 5.5
-    title_fs, header_fs, data_fs = 7, 5.5, 5.5
-    pad = 2 if num_cols > 8 else 3
+    # Komórki liczbowe to zwykłe stringi – rozmiar/interlinia jak w Paragraph
+    _, data_fs = _cell_font_sizes(num_cols)
+    pad = _cell_padding(num_cols)
 
-    cmds = [
-        ('BACKGROUND', (0, 0), (-1, 0), HEADER_BG_COLOR),
-        ('TEXTCOLOR', (0, 0), (-1, 0), HEADER_TEXT_COLOR),
-        ('FONTNAME', (0, 0), (-1, 0), FONT_BOLD),
-        ('FONTSIZE', (0, 0), (-1, 0), title_fs),
-        ('ALIGN', (0, 0), (-1, 0), 'LEFT'),
-        ('SPAN', (0, 0), (-1, 0)),
-        ('BACKGROUND', (0, 1), (-1, 1), colors.HexColor("#F7F9FF")),
-        ('TEXTCOLOR', (0, 1), (-1, 1), TEXT_COLOR),
-        ('FONTNAME', (0, 1), (-1, 1), FONT_BOLD),
-        ('FONTSIZE', (0, 1), (-1, 1), header_fs),
-        ('ALIGN', (0, 1), (-1, 1), 'CENTER'),
+    cmds = _BASE_LARGE_CMDS + [
         ('TEXTCOLOR', (0, 2), (-1, -2 if has_total_row else -1), TEXT_COLOR),
         ('FONTNAME', (0, 2), (-1, -2 if has_total_row else -1), FONT_REGULAR),
         ('FONTSIZE', (0, 2), (-1, -2 if has_total_row else -1), data_fs),
         ('ALIGN', (0, 2), (-1, -2 if has_total_row else -1), 'RIGHT'),
-        ('ALIGN', (0, 2), (0, -2 if has_total_row else -1), 'LEFT'),
         ('ROWBACKGROUNDS', (0, 2), (-1, -2 if has_total_row else -1),
-         [colors.white, ROW_ALT_COLOR]),
-        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-        ('BOX', (0, 0), (-1, -1), 0.5, BORDER_COLOR),
+         _ALT_ROW_CYCLE),
         ('LEFTPADDING', (0, 0), (-1, -1), pad),
         ('RIGHTPADDING', (0, 0), (-1, -1), pad),
-        ('TOPPADDING', (0, 0), (-1, -1), 2),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 2),
     ]
+    for ci in left_cols:
+        cmds.append(('ALIGN', (ci, 2), (ci, -2 if has_total_row else -1), 'LEFT'))
+    if has_data:
+        cmds.append(('LEADING', (0, 2), (-1, -2 if has_total_row else -1), data_fs + 2))
     if has_total_row:
         cmds.extend([
             ('BACKGROUND', (0, -1), (-1, -1), colors.HexColor("#E3E7ED")),
@@ -277,16 +455,29 @@ def get_large_table_style(has_total_row: bool = False, num_cols: int = 5) -> Tab
 #  BUDOWANIE TABEL
 # =========================================================================
 
+# Style stałe (bez zależności od danych) – tworzone raz na proces
+_SUMMARY_LABEL_STYLE = ParagraphStyle(
+    'SummaryLabel', fontName=FONT_BOLD, fontSize=6,
+    textColor=TEXT_COLOR, leading=8,
+)
+_SUMMARY_CELL_STYLE = ParagraphStyle(
+    'SummaryCell', fontName=FONT_REGULAR, fontSize=6,
+    textColor=TEXT_COLOR, leading=8,
+)
+_REPORT_TITLE_STYLE = ParagraphStyle(
+    'ReportTitle', fontName=FONT_BOLD, fontSize=18,
+    textColor=TEXT_COLOR, spaceAfter=2, leading=22,
+)
+_REPORT_DATE_STYLE = ParagraphStyle(
+    'ReportDate', fontName=FONT_REGULAR, fontSize=6,
+    textColor=colors.HexColor("#666666"), spaceAfter=4,
+)
+
+
 def create_summary_table(title: str, summary_data: List[List[str]]) -> Table:
     """Tworzy pionową tabelę podsumowania (tytuł + pary etykieta/wartość)."""
-    label_style = ParagraphStyle(
-        'SummaryLabel', fontName=FONT_BOLD, fontSize=6,
-        textColor=TEXT_COLOR, leading=8,
-    )
-    cell_style = ParagraphStyle(
-        'SummaryCell', fontName=FONT_REGULAR, fontSize=6,
-        textColor=TEXT_COLOR, leading=8,
-    )
+    label_style = _SUMMARY_LABEL_STYLE
+    cell_style = _SUMMARY_CELL_STYLE
     table_data = [[title, '']]
     for row in summary_data:
         label = row[0] if len(row) > 0 else ''
@@ -309,17 +500,9 @@ def create_summary_table(title: str, summary_data: List[List[str]]) -> Table:
 
 def create_report_header(client_name: str) -> List:
     """Tworzy nagłówek raportu: tytuł + data."""
-    title_style = ParagraphStyle(
-        'ReportTitle', fontName=FONT_BOLD, fontSize=18,
-        textColor=TEXT_COLOR, spaceAfter=2, leading=22,
-    )
-    date_style = ParagraphStyle(
-        'ReportDate', fontName=FONT_REGULAR, fontSize=6,
-        textColor=colors.HexColor("#666666"), spaceAfter=4,
-    )
     return [
-        Paragraph("Twoje bonusy", title_style),
-        Paragraph(f"Data wygenerowania: {datetime.now().strftime('%d.%m.%Y')}", date_style),
+        Paragraph("Twoje bonusy", _REPORT_TITLE_STYLE),
+        Paragraph(f"Data wygenerowania: {datetime.now().strftime('%d.%m.%Y')}", _REPORT_DATE_STYLE),
     ]
 
 
@@ -328,38 +511,97 @@ def _compute_col_widths(num_cols: int, headers: List[str],
                         currency_columns_2: List[int],
                         percentage_columns: List[int]) -> List[float]:
     """Inteligentnie rozkłada szerokości kolumn wg typu danych."""
+    return list(_col_widths_for_schema(
+        num_cols, tuple(headers), tuple(currency_columns),
+        tuple(currency_columns_2), tuple(percentage_columns),
+    ))
+
+
+@lru_cache(maxsize=256)
+def _col_widths_for_schema(num_cols: int, headers: tuple,
+                           currency_columns: tuple,
+                           currency_columns_2: tuple,
+                           percentage_columns: tuple) -> tuple:
+    """
+    Szerokości kolumn dla schematu tabeli – liczone raz per unikalny
+    zestaw nagłówków/typów kolumn (powtarzalne typy raportów).
+    """
     available = A4[0] - 2 * cm  # ~19.5 cm
 
     if num_cols <= 5:
-        return [available / num_cols] * num_cols
+        return (available / num_cols,) * num_cols
 
     # Wagi: tekst=3, waluta=2, procent=1.2, reszta=1.5
     weights = []
     for i in range(num_cols):
         h = headers[i].lower() if i < len(headers) else ''
-        if i in currency_columns:
-            weights.append(2.0)
-        elif i in currency_columns_2:
+        if i in currency_columns or i in currency_columns_2:
             weights.append(2.0)
         elif i in percentage_columns:
             weights.append(1.7)
-        elif any(k in h for k in ['nazwa']):
+        elif 'nazwa' in h:
             weights.append(3.0)
-        elif any(k in h for k in ['                          ']):
-
+        elif 'klasyfikacja' in h or 'typ' in h:
             weights.append(2.0)
-        elif any(k in h for k in ['                 ']):
-            
-            weights.append(1.7)
-        elif  any(k in h for k in ['klasyfikacja', 'typ']):
-            weights.append(2.0)
-        elif any(k in h for k in ['grupa']):
+        elif 'grupa' in h:
             weights.append(1.8)
         else:
             weights.append(1.5)
 
     total_w = sum(weights)
-    return [available * w / total_w for w in weights]
+    return tuple(available * w / total_w for w in weights)
+
+
+@lru_cache(maxsize=32)
+def _get_cell_styles(num_cols: int) -> tuple:
+    """
+    Style Paragraph komórek tabeli danych – tworzone raz per liczba kolumn.
+    Zwraca (header, data_right, data_left, total, total_label).
+    """
+    hdr_fs, data_fs = _cell_font_sizes(num_cols)
+
+    header_para_style = ParagraphStyle(
+        'TblHeader', fontName=FONT_BOLD, fontSize=hdr_fs,
+        textColor=TEXT_COLOR, leading=hdr_fs + 2,
+        alignment=1,  # CENTER
+    )
+    data_para_style = ParagraphStyle(
+        'TblData', fontName=FONT_REGULAR, fontSize=data_fs,
+        textColor=TEXT_COLOR, leading=data_fs + 2,
+        alignment=2,  # RIGHT
+    )
+    data_left_style = ParagraphStyle(
+        'TblDataLeft', fontName=FONT_REGULAR, fontSize=data_fs,
+        textColor=TEXT_COLOR, leading=data_fs + 2,
+        alignment=0,  # LEFT
+    )
+    total_para_style = ParagraphStyle(
+        'TblTotal', fontName=FONT_BOLD, fontSize=data_fs,
+        textColor=TEXT_COLOR, leading=data_fs + 2,
+        alignment=2,  # RIGHT
+    )
+    total_label_style = ParagraphStyle(
+        'TblTotalLabel', fontName=FONT_BOLD, fontSize=data_fs,
+        textColor=TEXT_COLOR, leading=data_fs + 2, alignment=0,
+    )
+    return (header_para_style, data_para_style, data_left_style,
+            total_para_style, total_label_style)
+
+
+# Znaki, przy których Paragraph renderuje inaczej niż zwykły string
+# (markup, encje, łamanie linii, zwijanie wielokrotnych spacji)
+_PLAIN_UNSAFE_RE = re.compile(r'[<>&\n\r\t]|  |^\s|\s$')
+
+
+def _fits_plain(value: str, max_width: float, font_size: float) -> bool:
+    """
+    Czy tekst można wstawić jako zwykły string zamiast Paragraph – bez
+    markupu i mieści się w jednej linii (Paragraph i tak by go nie zawinął).
+    """
+    if not value or _PLAIN_UNSAFE_RE.search(value):
+        return False
+    # Margines 0.5 pt – wartości na granicy zostają w Paragraph
+    return pdfmetrics.stringWidth(value, FONT_REGULAR, font_size) < max_width - 0.5
 
 
 def _wrap_cell(value: str, style: ParagraphStyle) -> Paragraph:
@@ -367,11 +609,20 @@ def _wrap_cell(value: str, style: ParagraphStyle) -> Paragraph:
     return Paragraph(str(value), style)
 
 def _wrap_header(value: str, style: ParagraphStyle) -> Paragraph:
+    """Nagłówek z <nobr> na każdym słowie – pojedyncze słowo bez znaczników."""
+    s = str(value)
+    if ' ' not in s:
+        return Paragraph(s, style)
+    return Paragraph(' '.join([f'<nobr>{w}</nobr>' for w in s.split(' ')]), style)
 
-    words = str(value).split(' ')
-    safe = ' '.join(f'<nobr>{w}</nobr>' for w in words)
-    return Paragraph(safe, style)
 
+@lru_cache(maxsize=256)
+def _header_cell(text: str, num_cols: int) -> Paragraph:
+    """
+    Nagłówek kolumny parsowany raz per (tekst, liczba kolumn) – ten sam
+    Paragraph współdzielony przez tabele (Table i tak zawija go przy rysowaniu).
+    """
+    return _wrap_header(text, _get_cell_styles(num_cols)[0])
 
 
 def create_large_table(title: str, headers: List[str], data: List[List[str]],
@@ -382,6 +633,7 @@ def create_large_table(title: str, headers: List[str], data: List[List[str]],
                        percentage_columns: List[int] = None,
                        subtitle: str = None) -> Table:
     """Tworzy dużą tabelę danych z zawijaniem tekstu i auto-wysokością."""
+    init_fonts()
     num_cols = len(headers)
     currency_columns = currency_columns or []
     percentage_columns = percentage_columns or []
@@ -389,37 +641,15 @@ def create_large_table(title: str, headers: List[str], data: List[List[str]],
 
     if col_widths is None:
         col_widths = _compute_col_widths(
-            num_cols, headers, currency_columns, percentage_columns,currency_columns_2
+            num_cols, headers,
+            currency_columns=currency_columns,
+            currency_columns_2=currency_columns_2,
+            percentage_columns=percentage_columns,
         )
 
-    # --- Style Paragraph dla komórek ---
-    if num_cols <= 5:
-        hdr_fs, data_fs = 7, 6.5
-    elif num_cols <= 8:
-        hdr_fs, data_fs = 6.5, 6
-    else:
-        hdr_fs, data_fs = 5.5, 5.5
-
-    header_para_style = ParagraphStyle(
-        'TblHeader', fontName=FONT_BOLD, fontSize=hdr_fs,
-        textColor=TEXT_COLOR, leading=hdr_fs + 2,
-        alignment=1,  # CENTER
-    )
-    data_para_style = ParagraphStyle(
-        'TblData', fontName=FONT_REGULAR, fontSize=data_fs,
-        textColor=TEXT_COLOR, leading=data_fs + 2,
-        alignment=2,  # RIGHT
-    )
-    data_left_style = ParagraphStyle(
-        'TblDataLeft', fontName=FONT_REGULAR, fontSize=data_fs,
-        textColor=TEXT_COLOR, leading=data_fs + 2,
-        alignment=0,  # LEFT
-    )
-    total_para_style = ParagraphStyle(
-        'TblTotal', fontName=FONT_BOLD, fontSize=data_fs,
-        textColor=TEXT_COLOR, leading=data_fs + 2,
-        alignment=2,  # RIGHT
-    )
+    # --- Style Paragraph dla komórek (cache per liczba kolumn) ---
+    (_, data_para_style, data_left_style,
+     total_para_style, total_label_style) = _get_cell_styles(num_cols)
 
     # Kolumny tekstowe (wyrównanie do lewej)
     text_cols = set()
@@ -429,71 +659,92 @@ def create_large_table(title: str, headers: List[str], data: List[List[str]],
 
     # --- Wiersz tytułowy ---
     display_title = f"{title} – {subtitle}" if subtitle else title
-    table_data = [[display_title] + [''] * (num_cols - 1)]
+    # Lista alokowana raz: tytuł + nagłówki + dane + SUMA (lub 3 puste wiersze)
+    has_total = add_total_row and bool(data)
+    n_rows = 2 + len(data) + (1 if has_total else 0) + (0 if data else 3)
+    table_data = [None] * n_rows
+    table_data[0] = [display_title] + [''] * (num_cols - 1)
 
     # --- Nagłówki (zawinięte w Paragraph) ---
-    table_data.append([
+    table_data[1] = [
         #_wrap_cell(h, header_para_style) for h in headers
-        _wrap_header(h, header_para_style) for h in headers
-    ])
+        _header_cell(str(h), num_cols) for h in headers
+    ]
+
+    # Wiersze znormalizowane RAZ: stringi (None → ''), dopełnione do num_cols
+    blank = [''] * num_cols
+    data = [
+        [v if isinstance(v, str) else ('' if v is None else str(v))
+         for v in [*row, *blank][:num_cols]]
+        for row in data
+    ]
+    # Układ kolumnowy: jedna krotka per kolumna – parsowanie, formatowanie
+    # i SUMA idą po jednej ciągłej sekwencji, do wierszy dopiero przy Table
+    columns = list(zip(*data)) if data else [()] * num_cols
+
+    # --- Parsowanie liczb: RAZ per kolumnę (formatowanie + SUMA) ---
+    numeric_cols = set(currency_columns) | set(currency_columns_2) | set(percentage_columns)
+    parse_cols = set(numeric_cols)
+    if has_total:
+        parse_cols.update(range(1, num_cols))
+    parsed = {ci: [_parse_number(v) for v in columns[ci]] for ci in parse_cols}
+
+    # Formatowanie wsadowe – jedno wywołanie per kolumnę liczbową
+    formatted_cols = {}
+    for ci in numeric_cols:
+        if ci in currency_columns or ci in currency_columns_2:
+            formatted_cols[ci] = _format_currency_batch(parsed[ci])
+        else:
+            formatted_cols[ci] = _format_percentage_batch(parsed[ci])
 
-    # --- Dane ---
-    for row in data:
-        padded = (row + [''] * num_cols)[:num_cols]
-        formatted = []
-        for i, val in enumerate(padded):
-            if i in currency_columns and is_numeric(val):
-                txt = format_as_currency(val)
-                formatted.append(_wrap_cell(txt, data_para_style))
-            elif i in currency_columns_2 and is_numeric(val):
-                txt = format_as_currency(val)
-                formatted.append(_wrap_cell(txt, data_para_style))
-            elif i in percentage_columns and is_numeric(val):
-                txt = format_as_percentage(val)
-                formatted.append(_wrap_cell(txt, data_para_style))
-            elif i in text_cols:
-                formatted.append(_wrap_cell(str(val), data_left_style))
-            else:
-                formatted.append(_wrap_cell(str(val), data_para_style))
-        table_data.append(formatted)
+    # Szerokość na tekst w komórce (bez paddingu) – do decyzji string/Paragraph
+    pad = _cell_padding(num_cols)
+    if all(isinstance(w, (int, float)) for w in col_widths):
+        text_widths = [w - 2 * pad for w in col_widths]
+    else:
+        text_widths = [0] * num_cols
+    data_fs = data_para_style.fontSize
+
+    # --- Dane: kolumnami (styl i szerokość ustalane raz per kolumnę) ---
+    cell_cols = []
+    for i, col in enumerate(columns):
+        style = data_left_style if i in text_cols else data_para_style
+        width = text_widths[i]
+        fmt = formatted_cols.get(i) or (None,) * len(col)
+        cell_cols.append([
+            # Liczby nie zawijają się – zwykły string (styl z TableStyle);
+            # krótki tekst bez markupu – bez parsowania Paragraph
+            txt if txt is not None
+            else val if _fits_plain(val, width, data_fs)
+            else Paragraph(val, style)
+            for txt, val in zip(fmt, col)
+        ])
+    for r, row in enumerate(zip(*cell_cols)):
+        table_data[2 + r] = list(row)
 
     # --- Wiersz SUMA ---
-    if add_total_row and data:
-        total = [_wrap_cell('SUMA', ParagraphStyle(
-            'TblTotalLabel', fontName=FONT_BOLD, fontSize=data_fs,
-            textColor=TEXT_COLOR, leading=data_fs + 2, alignment=0,
-        ))]
-        for ci in range(1, num_cols):
-            if ci in currency_columns_2:
-                total.append('')
-            elif ci in percentage_columns:
-                s = calculate_column_max(data, ci)
-                if s:
-                    total.append(_wrap_cell(format_as_percentage(s), total_para_style))
-                else:
-                    total.append('')
-            else:
-                s = calculate_column_sum(data, ci)
-                if s and ci in currency_columns:
-                    total.append(_wrap_cell(format_as_currency(s), total_para_style))
-                elif s:
-                    total.append(_wrap_cell(s, total_para_style))
-                else:
-                    total.append('')
-        table_data.append(total)
+    if has_total:
+        totals = _compute_totals(parsed, num_cols, currency_columns,
+                                 currency_columns_2, percentage_columns)
+        total = [_wrap_cell('SUMA', total_label_style)] + [
+            _wrap_cell(txt, total_para_style) if txt else '' for txt in totals
+        ]
+        table_data[-1] = total
 
     if not data:
-        for _ in range(3):
-            table_data.append([''] * num_cols)
+        for r in range(2, n_rows):
+            table_data[r] = [''] * num_cols
 
     # Auto row heights (None = oblicz automatycznie na podstawie zawartości)
     title_h = 0.55 * cm
-    row_heights = [title_h] + [None] * (len(table_data) - 1)
+    row_heights = [title_h] + [None] * (n_rows - 1)
 
     table = Table(table_data, colWidths=col_widths, rowHeights=row_heights)
     table.setStyle(get_large_table_style(
-        has_total_row=add_total_row and bool(data),
+        has_total_row=has_total,
         num_cols=num_cols,
+        has_data=bool(data),
+        left_cols=tuple(sorted(text_cols)),
     ))
     return table
 
@@ -507,6 +758,27 @@ def create_large_table(title: str, headers: List[str], data: List[List[str]],
 # =========================================================================
 
 
+# Cache wymiarów logo: (ścieżka, mtime) -> (szerokość, wysokość) w pt
+_logo_cache: Dict[tuple, tuple] = {}
+
+_PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+
+def _image_size(path: str) -> tuple:
+    """
+    Wymiary obrazka (szer., wys.) w px. PNG czytany z nagłówka IHDR
+    (bez importu PIL), inne formaty – fallback na PIL.
+    """
+    with open(path, 'rb') as f:
+        head = f.read(24)
+    if head[:8] == _PNG_SIGNATURE and head[12:16] == b'IHDR':
+        return struct.unpack('>II', head[16:24])
+
+    from PIL import Image as PILImage
+    with PILImage.open(path) as img:
+        return img.size
+
+
 def add_logo_to_elements(elements: List, logo_path: str = "logo.png") -> List:
     """
     Dodaje logo na początku dokumentu z pełną szerokością strony.
@@ -520,26 +792,29 @@ def add_logo_to_elements(elements: List, logo_path: str = "logo.png") -> List:
     """
     try:
         from reportlab.platypus import Image
-        from PIL import Image as PILImage
-        
+
         # Sprawdź czy plik istnieje
         if not os.path.exists(logo_path):
-            print(f"⚠️  Logo nie znalezione: {logo_path}")
+            log.warning(f"⚠️  Logo nie znalezione: {logo_path}")
             return elements
         
-        # Pobierz rzeczywiste wymiary logo
-        img = PILImage.open(logo_path)
-        img_width, img_height = img.size
-        
-        # Oblicz proporcje
-        aspect_ratio = img_height / img_width
-        
-        # Szerokość logo = szerokość strony minus marginesy
-        page_width = A4[0] - 2 * cm  # ~19.5 cm
-        logo_width = page_width
-        logo_height = logo_width * aspect_ratio
-        
-        # Utwórz obiekt Image z obliczonymi wymiarami
+        # Wymiary liczone raz na proces (klucz: ścieżka + mtime pliku)
+        key = (logo_path, os.path.getmtime(logo_path))
+        dims = _logo_cache.get(key)
+        if dims is None:
+            # Pobierz rzeczywiste wymiary logo
+            img_width, img_height = _image_size(logo_path)
+
+            # Oblicz proporcje
+            aspect_ratio = img_height / img_width
+
+            # Szerokość logo = szerokość strony minus marginesy
+            page_width = A4[0] - 2 * cm  # ~19.5 cm
+            dims = (page_width, page_width * aspect_ratio)
+            _logo_cache[key] = dims
+        logo_width, logo_height = dims
+
+        # Nowy flowable per dokument (Image trzyma stan layoutu)
         logo = Image(logo_path, width=logo_width, height=logo_height)
         logo.hAlign = 'CENTER'
         
@@ -550,7 +825,7 @@ def add_logo_to_elements(elements: List, logo_path: str = "logo.png") -> List:
         return result
         
     except Exception as e:
-        print(f"⚠️  Błąd dodawania logo: {e}")
+        log.warning(f"⚠️  Błąd dodawania logo: {e}")
         return elements
 
 
@@ -590,36 +865,31 @@ def create_top_section(client_name: str, summary_title: str,
 #  GENEROWANIE PDF
 # =========================================================================
 
-def generate_pdf(client_name: str, summary_title: str,
-                 summary_data: List[List[str]],
-                 tables: List[Dict[str, Any]],
-                 filename: str = "raport.pdf",
-                 subfolder: str = None,
-                 logo_path: str = None) -> str:
-    """
-    Generuje PDF z dynamiczną liczbą tabel.
+# Wysokość ramki A4 (marginesy top 0.5 cm + bottom 1 cm) i szacowany wiersz
+_PAGE_FRAME_H = A4[1] - 1.5 * cm
+_EST_ROW_H = 0.4 * cm
 
-    Args:
-        client_name: Nazwa klienta (do nagłówka)
-        summary_title: Tytuł tabeli podsumowania
-        summary_data: Dane podsumowania [[etykieta, wartość], ...]
-        tables: Lista słowników opisujących tabele:
-                [{'title', 'headers', 'data', 'currency_columns',
-                  'percentage_columns', 'add_total_row', 'column_widths'}, ...]
-        filename: Nazwa pliku PDF
-        subfolder: Opcjonalny podfolder wyjściowy
 
-    Returns:
-        Ścieżka do wygenerowanego pliku
-    """
-    output_path = get_output_path(filename, subfolder)
+def _estimate_table_height(t: Dict[str, Any]) -> float:
+    """Zgrubna wysokość tabeli: wiersze danych + tytuł, nagłówek, SUMA."""
+    return (len(t['data']) + 3) * _EST_ROW_H
 
-    doc = SimpleDocTemplate(
-        output_path, pagesize=A4,
+
+def _new_doc(target) -> SimpleDocTemplate:
+    """Szablon dokumentu A4 z marginesami raportu."""
+    return SimpleDocTemplate(
+        target, pagesize=A4,
         leftMargin=1 * cm, rightMargin=1 * cm,
         topMargin=0.5 * cm, bottomMargin=1 * cm,
     )
 
+
+def _build_report_elements(client_name: str, summary_title: str,
+                           summary_data: List[List[str]],
+                           tables: List[Dict[str, Any]],
+                           logo_path: str = None) -> List:
+    """Flowables jednego raportu: logo, nagłówek + podsumowanie, tabele."""
+    init_fonts()
     elements = create_top_section(client_name, summary_title, summary_data)
     elements.append(Spacer(1, 0.4 * cm))
 
@@ -636,39 +906,363 @@ def generate_pdf(client_name: str, summary_title: str,
             subtitle=t.get('subtitle', ''),
         )
 
-        elements.append(KeepTogether(table))
+        # Tabela dłuższa niż strona i tak się podzieli – KeepTogether
+        # wymuszałby tylko zbędny przebieg layoutu (i przejście na nową stronę)
+        if _estimate_table_height(t) > _PAGE_FRAME_H:
+            elements.append(table)
+        else:
+            elements.append(KeepTogether(table))
 
-        #elements.append(table)
         if i < len(tables) - 1:
             elements.append(Spacer(1, 0.3 * cm))
     if logo_path:
         elements = add_logo_to_elements(elements, logo_path)
+    return elements
+
+
+def _write_buffer(buf: io.BytesIO, output_path: str) -> None:
+    """Zapisuje wyrenderowany PDF jednym wywołaniem write."""
+    with open(output_path, 'wb') as f:
+        f.write(buf.getbuffer())
+
+
+def generate_pdf(client_name: str, summary_title: str,
+                 summary_data: List[List[str]],
+                 tables: List[Dict[str, Any]],
+                 filename: str = "raport.pdf",
+                 subfolder: str = None,
+                 logo_path: str = None,
+                 output_stream: Optional[BinaryIO] = None) -> Optional[str]:
+    """
+    Generuje PDF z dynamiczną liczbą tabel.
+
+    Args:
+        client_name: Nazwa klienta (do nagłówka)
+        summary_title: Tytuł tabeli podsumowania
+        summary_data: Dane podsumowania [[etykieta, wartość], ...]
+        tables: Lista słowników opisujących tabele:
+                [{'title', 'headers', 'data', 'currency_columns',
+                  'percentage_columns', 'add_total_row', 'column_widths'}, ...]
+        filename: Nazwa pliku PDF
+        subfolder: Opcjonalny podfolder wyjściowy
+        output_stream: Otwarty strumień binarny – PDF zapisywany wprost do
+                       niego (bez bufora pośredniego); wywołujący go zamyka,
+                       filename/subfolder są wtedy pomijane
+
+    Returns:
+        Ścieżka do wygenerowanego pliku (dla strumienia – jego nazwa,
+        None gdy strumień nie jest plikiem)
+    """
+    elements = _build_report_elements(
+        client_name, summary_title, summary_data, tables, logo_path)
+
+    if output_stream is not None:
+        name = getattr(output_stream, 'name', None)
+        output_path = name if isinstance(name, str) else None
+        _new_doc(output_stream).build(elements)
+        log.debug("✓ PDF: %s (%d tabel)", output_path or '<strumień>', len(tables))
+        return output_path
+
+    output_path = get_output_path(filename, subfolder)
+
+    # Render do bufora w pamięci – jeden zapis pliku zamiast wielu małych
+    buf = io.BytesIO()
+    doc = _new_doc(buf)
+    doc.build(elements)
+    _write_buffer(buf, output_path)
+    log.debug("✓ PDF: %s (%d tabel)", output_path, len(tables))
+    return output_path
+
+
+def generate_pdf_batch(reports: List[Dict[str, Any]],
+                       filename: str = "raporty.pdf",
+                       subfolder: str = None,
+                       logo_path: str = None) -> str:
+    """
+    Generuje JEDEN zbiorczy PDF z wielu raportów (każdy od nowej strony).
+    Jeden szablon i jeden doc.build zamiast N – dla odbiorców, którzy
+    akceptują plik zbiorczy. Opcjonalne API – główny przebieg nadal
+    renderuje osobny plik na raport.
+
+    Args:
+        reports: Lista payloadów z kluczami 'client_name', 'summary_title',
+                 'summary_data', 'tables' (jak w generate_pdf)
+        filename: Nazwa pliku PDF
+        subfolder: Opcjonalny podfolder wyjściowy
+        logo_path: Logo dodawane na początku każdego raportu
+
+    Returns:
+        Ścieżka do wygenerowanego pliku
+    """
+    output_path = get_output_path(filename, subfolder)
+
+    buf = io.BytesIO()
+    doc = _new_doc(buf)
+    elements = []
+    for i, report in enumerate(reports):
+        if i:
+            elements.append(PageBreak())
+        elements.extend(_build_report_elements(
+            report['client_name'], report['summary_title'],
+            report['summary_data'], report['tables'], logo_path,
+        ))
 
     doc.build(elements)
-    print(f"✓ PDF: {output_path} ({len(tables)} tabel)")
+    _write_buffer(buf, output_path)
+    log.info(f"✓ PDF: {output_path} ({len(reports)} raportów)")
     return output_path
 
 
+# =========================================================================
+#  LOG CSV (WĄTEK W TLE)
+# =========================================================================
+
+def flatten_payload_for_csv(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Spłaszcza podsumowanie i wszystkie komórki tabel do kolumn logu CSV
+    (summary_<etykieta>, <tabela>_wiersze, <tabela>_w<nr>_<nagłówek>).
+    """
+    csv_fields = {}
+    for label, value in payload['summary_data']:
+        csv_fields[f'summary_{label}'] = value
+    for table in payload['tables']:
+        tname = table['title']
+        sub = table.get('subtitle', '')
+        prefix = f"{tname}_{sub}" if sub else tname
+        headers = table['headers']
+        csv_fields[f'{prefix}_wiersze'] = len(table['data'])
+        for row_idx, row_data in enumerate(table['data'], 1):
+            for col_idx, hdr in enumerate(headers):
+                val = row_data[col_idx] if col_idx < len(row_data) else ''
+                csv_fields[f'{prefix}_w{row_idx}_{hdr}'] = val
+    return csv_fields
+
+
+class CsvLogWriter:
+    """
+    Zapisuje log generowania do CSV w osobnym wątku – wiersze trafiają na
+    dysk w trakcie renderowania, a nie trzymane w pamięci do końca.
+
+    Kolumny są dokładane w kolejności wystąpienia, więc każdy wiersz
+    zapisany wcześniej jest prefiksem pełnego nagłówka (brakujące pola
+    na końcu = puste). Ciało idzie do pliku .part, a close() dopisuje
+    nagłówek z kompletem kolumn i skleja plik docelowy.
+
+    Komórki tabel payloadu spłaszcza wątek zapisu – poza pętlą budującą
+    payloady, a wiersze zostają w kolejności write().
+    """
+
+    FLUSH_EVERY = 100
+    # Limit wierszy czekających na zapis – gdy dysk nie nadąża, write()
+    # chwilowo blokuje zamiast trzymać w pamięci tysiące szerokich słowników
+    QUEUE_MAX = 1000
+    # Co tyle sekund czekania na miejsce w kolejce sprawdzane jest, czy wątek
+    # zapisu jeszcze działa – po jego błędzie put() nie wisi w nieskończoność
+    PUT_TIMEOUT = 1.0
+    _STOP = object()
+
+    def __init__(self, path: str, delimiter: str = ';'):
+        self.path = path
+        self.delimiter = delimiter
+        self._part_path = path + '.part'
+        self._keys: Dict[str, None] = {}
+        self._rows_written = 0
+        self._error: Optional[BaseException] = None
+        self._closed = False
+        self._queue: queue.Queue = queue.Queue(maxsize=self.QUEUE_MAX)
+        self._thread = threading.Thread(target=self._run, name='csv-log', daemon=True)
+        self._thread.start()
+
+    def write(self, row: Dict[str, Any],
+              payload: Optional[Dict[str, Any]] = None) -> None:
+        """
+        Kolejkuje wiersz do zapisu (blokuje tylko przy pełnej kolejce).
+        payload – dokładany do wiersza przez flatten_payload_for_csv w wątku zapisu.
+        Po błędzie wątku zapisu wiersze są pomijane – błąd zgłasza close().
+        """
+        self._put((row, payload))
+
+    def _put(self, item) -> bool:
+        """Wstawia do kolejki; False gdy wątek zapisu już nie działa."""
+        while self._thread.is_alive():
+            try:
+                self._queue.put(item, timeout=self.PUT_TIMEOUT)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _run(self):
+        try:
+            with open(self._part_path, 'w', newline='', encoding='utf-8') as f:
+                writer = csv.writer(f, delimiter=self.delimiter)
+                while True:
+                    item = self._queue.get()
+                    if item is self._STOP:
+                        break
+                    row, payload = item
+                    if payload is not None:
+                        row.update(flatten_payload_for_csv(payload))
+                    self._keys.update(dict.fromkeys(row))
+                    writer.writerow([row.get(k, '') for k in self._keys])
+                    self._rows_written += 1
+                    if self._rows_written % self.FLUSH_EVERY == 0:
+                        f.flush()
+        except Exception as e:
+            # Wątek kończy się – write() przestaje czekać, close() rzuci błąd
+            self._error = e
+            log.warning(f"  ⚠️  Log CSV: zapis przerwany – {e}")
+
+    def close(self) -> Optional[str]:
+        """
+        Kończy wątek i składa plik CSV. Zwraca ścieżkę (None gdy brak wierszy
+        albo close() już wywołane); błąd wątku zapisu rzucany jest tutaj.
+        """
+        if self._closed:
+            return None
+        self._closed = True
+        self._put(self._STOP)
+        self._thread.join()
+        try:
+            if self._error is not None:
+                raise self._error
+            if not self._rows_written:
+                return None
+            with open(self.path, 'w', newline='', encoding='utf-8-sig') as out:
+                csv.writer(out, delimiter=self.delimiter).writerow(list(self._keys))
+                with open(self._part_path, 'r', newline='', encoding='utf-8') as body:
+                    shutil.copyfileobj(body, out)
+            return self.path
+        finally:
+            # .part mogło nie powstać (błąd otwarcia w _run)
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(self._part_path)
+
+
 # =========================================================================
 #  WORKER DLA MULTIPROCESSING
 # =========================================================================
 
+# Payloady od tej wielkości (po pickle) idą przez shared memory, mniejsze – wprost
+SHM_MIN_PAYLOAD = 64 * 1024
+
+# Górny limit paczki zadań – pierwsze wyniki (i zwolnienie shm) nie czekają
+# na setki PDF-ów przy bardzo dużych batchach
+RENDER_CHUNK_MAX = 64
+
+
+def render_chunksize(total_tasks: int, workers: int) -> int:
+    """Rozmiar paczki zadań: ~4 paczki na worker, w granicach 1..RENDER_CHUNK_MAX."""
+    return max(1, min(RENDER_CHUNK_MAX, total_tasks // (4 * workers)))
+
+
+def publish_payload(payload: Dict[str, Any]) -> tuple:
+    """
+    Serializuje payload RAZ. Duży trafia do bloku SharedMemory – do workera
+    leci tylko (nazwa, rozmiar) zamiast całych danych przez pipe. Mały leci
+    jako gotowe bajty – executor kopiuje je bez ponownego przechodzenia
+    po zagnieżdżonych listach tabel.
+
+    Returns:
+        (shm, ref) – shm do zwolnienia przez wywołującego (None dla małych),
+        ref do przekazania w zadaniu: bajty pickle lub (nazwa_shm, rozmiar)
+    """
+    buf = pickle.dumps(payload, protocol=pickle.HIGHEST_PROTOCOL)
+    if len(buf) < SHM_MIN_PAYLOAD:
+        return None, buf
+    shm = shared_memory.SharedMemory(create=True, size=len(buf))
+    shm.buf[:len(buf)] = buf
+    return shm, (shm.name, len(buf))
+
+
+def _load_payload(ref) -> Dict[str, Any]:
+    """Odtwarza payload z ref (dict, bajty pickle lub (nazwa_shm, rozmiar))."""
+    if isinstance(ref, dict):
+        return ref
+    if isinstance(ref, bytes):
+        return pickle.loads(ref)
+    name, size = ref
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        view = shm.buf[:size]
+        try:
+            return pickle.loads(view)
+        finally:
+            view.release()
+    finally:
+        shm.close()
+
+
+# Bufor pliku PDF workera – cały dokument mieści się w jednym zapisie
+PDF_WRITE_BUFFER = 1 << 20
+
+
+def render_report_payload(payload: Dict[str, Any], logo_path: str = None) -> str:
+    """
+    Generuje PDF z gotowego payloadu – etap czysto CPU (bez bazy).
+    Para dla ReportFactory.build_report_payload (etap I/O): payload jest
+    picklowalny, więc renderowanie idzie w ProcessPoolExecutor poza GIL-em
+    procesu budującego dane.
+    """
+    output_path = get_output_path(payload['filename'], payload['subfolder'])
+    # PDF prosto do pliku (ReportLab zapisuje całość jednym write) – bez
+    # kopii w BytesIO; niedokończony plik usuwany przy błędzie renderowania
+    try:
+        with open(output_path, 'wb', buffering=PDF_WRITE_BUFFER) as output:
+            generate_pdf(
+                client_name=payload['client_name'],
+                summary_title=payload['summary_title'],
+                summary_data=payload['summary_data'],
+                tables=payload['tables'],
+                logo_path=logo_path,
+                output_stream=output,
+            )
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(output_path)
+        raise
+    return output_path
+
+
 def _render_pdf_task(args):
     """
     Funkcja robocza dla ProcessPoolExecutor.
-    Przyjmuje serializowalny payload (dict) i generuje PDF.
+    Przyjmuje payload (dict lub referencję do shared memory) i generuje PDF.
     Każdy proces importuje moduł niezależnie = bezpieczne.
     """
-    payload, logo_path = args
-    return generate_pdf(
-        client_name=payload['client_name'],
-        summary_title=payload['summary_title'],
-        summary_data=payload['summary_data'],
-        tables=payload['tables'],
-        filename=payload['filename'],
-        subfolder=payload['subfolder'],
-        logo_path=logo_path,
-    )
+    payload_ref, logo_path = args
+    return render_report_payload(_load_payload(payload_ref), logo_path)
+
+
+def _render_pdf_task_safe(args):
+    """Wrapper dla puli – zwraca (ścieżka, błąd) zamiast rzucać wyjątek."""
+    try:
+        return _render_pdf_task(args), None
+    except Exception as e:
+        return None, str(e)
+
+
+def _render_pdf_chunk(args_list):
+    """Renderuje paczkę payloadów w jednym zadaniu – lista (ścieżka, błąd)."""
+    return [_render_pdf_task_safe(args) for args in args_list]
+
+
+def _pool_init(font_bytes: Optional[Dict[str, bytes]] = None,
+               date: Optional[str] = None):
+    """
+    Initializer procesu roboczego – czcionki i metryki ładowane raz na
+    proces, a nie przy pierwszym PDF-ie z każdej paczki. Bajty TTF
+    przychodzą z procesu głównego, więc worker nie czyta plików z dysku;
+    data przebiegu też – folder wyjściowy wspólny dla całego batcha.
+    """
+    global _run_date
+    if date is not None:
+        _run_date = date
+    # Przy "fork" czcionki są już zarejestrowane w procesie głównym
+    # (dziedziczone) – bajty przydają się przy starcie "spawn"
+    init_fonts(font_bytes)
+    for font_name in (FONT_REGULAR, FONT_BOLD):
+        pdfmetrics.stringWidth('0', font_name, 7)
 
 
 # =========================================================================
@@ -679,11 +1273,24 @@ if __name__ == "__main__":
     from report_factory import ReportFactory
     from report_types import ReportType
 
-    print("=" * 60)
-    print("  GENERATOR RAPORTÓW PDF")
-    print(f"  {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-    print(f"  Tryb: {'MOCK' if USE_MOCK else 'SAP HANA'}")
-    print("=" * 60)
+    parser = argparse.ArgumentParser(description="Generator raportów PDF")
+    parser.add_argument(
+        '-j', '--jobs', type=int, default=None,
+        help="liczba procesów renderujących PDF (domyślnie min(6, liczba CPU))",
+    )
+    args = parser.parse_args()
+
+    log_listener = start_log_listener()
+
+    # TTF czytane z dysku raz – rejestracja tutaj, bajty idą do workerów
+    font_bytes = fonts.read_font_bytes()
+    init_fonts(font_bytes)
+
+    log.info("=" * 60)
+    log.info("  GENERATOR RAPORTÓW PDF")
+    log.info(f"  {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    log.info(f"  Tryb: {'MOCK' if USE_MOCK else 'SAP HANA'}")
+    log.info("=" * 60)
     
     LOGO_PATH = "logo.png"
 
@@ -693,13 +1300,16 @@ if __name__ == "__main__":
         #ReportType.WYKONANIE_C_TYP_A_TYDZIEN,
     ]
     SINGLE_CONTRACT = None
-    MAX_WORKERS = min(6, (os.cpu_count() or 2))  # procesy do renderowania PDF
+    # Procesy do renderowania PDF (--jobs nadpisuje domyślną liczbę)
+    MAX_WORKERS = max(1, args.jobs) if args.jobs else min(6, (os.cpu_count() or 2))
+    DB_POOL_SIZE = 4  # sesje HANA – równoległe wywołania procedur w prefetch
 
     with Timer("Generowanie raportów") as total:
 
         factory = None
+        csv_log = None
         try:
-            factory = ReportFactory(config_dir="config")
+            factory = ReportFactory(config_dir="config", pool_size=DB_POOL_SIZE)
 
             # Pobierz listę umów
             contracts = factory.get_contracts_list()
@@ -707,171 +1317,210 @@ if __name__ == "__main__":
             if SINGLE_CONTRACT:
                 contracts = [c for c in contracts if c ['nr_umowy'] == SINGLE_CONTRACT]
                 if not contracts:
-                    print("Nie znaleziono")
+                    log.info("Nie znaleziono")
+                    log_listener.stop()
                     exit(0)
 
-            print(f"\n📋 Umowy ({len(contracts)}):")
-            for c in contracts:
-                print(f"   {c['nr_umowy']}  {c['klient']}  [{c['podtyp_klient']}]  ID={c['id']}  PLA={c['pla']}")
+            log.info(f"\n📋 Umowy ({len(contracts)}):")
+            if log.isEnabledFor(logging.DEBUG):
+                for c in contracts:
+                    log.debug("   %s  %s  [%s]  ID=%s  PLA=%s", c['nr_umowy'], c['klient'],
+                              c['podtyp_klient'], c['id'], c['pla'])
 
-            TYP_A_TYPES = [rt for rt in ACTIVE_TYPES if rt in (
+            TYP_A_SET = frozenset({
                 ReportType.WYKONANIE_A_TYP_A_TYDZIEN,
                 #ReportType.WYKONANIE_B_TYP_A_TYDZIEN
                 #ReportType.WYKONANIE_C_TYP_A_TYDZIEN,
-            )]
+            })
 
-            TYP_B_TYPES = [rt for rt in ACTIVE_TYPES if rt in (
+            TYP_B_SET = frozenset({
                 ReportType.WYKONANIE_A_TYP_B_TYDZIEN,
                 #ReportType.WYKONANIE_B_TYP_A_TYDZIEN
-            )]
+            })
+
+            TYP_A_TYPES = [rt for rt in ACTIVE_TYPES if rt in TYP_A_SET]
+            TYP_B_TYPES = [rt for rt in ACTIVE_TYPES if rt in TYP_B_SET]
+
+            # Typy z konfiguracją – filtrowane raz, przed pętlą po umowach
+            types_a = tuple(rt for rt in TYP_A_TYPES if rt in factory.configs)
+            types_b = tuple(rt for rt in TYP_B_TYPES if rt in factory.configs)
 
             all_generated = []
             pdf_tasks = []
 
-            if TYP_A_TYPES:
-                seen_nr = set()
-                for c in contracts:
-                    nr = c['nr_umowy']
-                    if nr in seen_nr:
-                        continue
-                    seen_nr.add(nr)
-                    for rt in TYP_A_TYPES:
-                        if rt in factory.configs:
-                            pdf_tasks.append((rt, nr, None, c['pla'], c['id']))
-
-            # --- Typ B: 1 raport per lokalizacja (sklep) ---
-            if TYP_B_TYPES:
-                seen_nr_b = set()
-                for c in contracts:
-                    nr = c['nr_umowy']
-                    if nr in seen_nr_b:
-                        continue
-                    seen_nr_b.add(nr)
-                    locations = factory.get_locations_for_contract(nr)
-                    print(f"  📍 {nr}: {len(locations)} lokalizacji")
+            # Lokalizacje Typ B wszystkich umów jednym zapytaniem (zamiast N)
+            loc_map = factory.get_locations_for_contracts(
+                [c['nr_umowy'] for c in contracts]
+            ) if types_b else {}
+
+            # --- Jedno przejście po umowach: Typ A (per umowa) + Typ B (per lokalizacja) ---
+            seen_nr = set()
+            for c in contracts:
+                nr = c['nr_umowy']
+                # Duplikat nr_umowy – zostaje pierwszy wiersz
+                if nr in seen_nr:
+                    continue
+                seen_nr.add(nr)
+                for rt in types_a:
+                    pdf_tasks.append((rt, nr, None, c['pla'], c['id']))
+                if types_b:
+                    locations = loc_map.get(nr, [])
+                    log.debug("  📍 %s: %d lokalizacji", nr, len(locations))
                     for lok in locations:
-                        for rt in TYP_B_TYPES:
-                            if rt in factory.configs:
-                                pdf_tasks.append((rt, nr, lok, c['pla'], c['id']))
+                        for rt in types_b:
+                            pdf_tasks.append((rt, nr, lok, c['pla'], c['id']))
 
             # =============================================================
             #  FAZA 1: BATCH PREFETCH — pobierz WSZYSTKIE dane z HANA
             # =============================================================
-            factory.prepare_batch(ACTIVE_TYPES)
-
-            # =============================================================
-            #  FAZA 2: Budowanie payloadów (sekwencyjnie, używa cache)
-            # =============================================================
-            total_tasks = len(pdf_tasks)
-            print(f"\n📦 Budowanie {total_tasks} payloadów...")
-
-            payloads = []       # (payload, task_info) do renderowania
-            csv_log_rows = []   # log do CSV
-
-            for idx, (rt, nr, lok, pla, cid) in enumerate(pdf_tasks, 1):
-                try:
-                    payload = factory.build_report_payload(
-                        rt, nr, lokalizacja=lok, pla=pla, contract_id=cid,
-                    )
-                    payloads.append((payload, (rt, nr, lok, pla, cid)))
-
-                    # --- Zbierz dane do CSV (już tu, bo mamy pełne dane) ---
-                    csv_row = {
-                        'plik': payload['filename'],
-                        'typ_raportu': rt.value,
-                        'nr_umowy': nr,
-                        'lokalizacja': lok or '',
-                        'pla': pla or '',
-                        'id': cid or '',
-                        'klient': payload['client_name'],
-                    }
-                    for label, value in payload['summary_data']:
-                        csv_row[f'summary_{label}'] = value
-                    for table in payload['tables']:
-                        tname = table['title']
-                        sub = table.get('subtitle', '')
-                        prefix = f"{tname}_{sub}" if sub else tname
-                        headers = table['headers']
-                        csv_row[f'{prefix}_wiersze'] = len(table['data'])
-                        for row_idx, row_data in enumerate(table['data'], 1):
-                            for col_idx, hdr in enumerate(headers):
-                                val = row_data[col_idx] if col_idx < len(row_data) else ''
-                                csv_row[f'{prefix}_w{row_idx}_{hdr}'] = val
-                    csv_log_rows.append(csv_row)
-
-                except Exception as e:
-                    print(f"  X {rt.value} nr={nr}: {e}")
-                    csv_log_rows.append({
-                        'plik': 'BŁĄD',
-                        'typ_raportu': rt.value,
-                        'nr_umowy': nr,
-                        'lokalizacja': lok or '',
-                        'pla': pla or '',
-                        'id': cid or '',
-                        'klient': '',
-                        'error': str(e),
-                    })
-
-            # Zamknij połączenie z bazą — dane już w pamięci
-            factory.close()
-            factory = None
+            factory.prepare_batch(
+                ACTIVE_TYPES, tasks=[(rt, nr, lok) for rt, nr, lok, _, _ in pdf_tasks],
+            )
 
             # =============================================================
-            #  FAZA 3: Renderowanie PDF — równolegle (ProcessPoolExecutor)
+            #  FAZA 2+3: Budowanie payloadów (cache) + renderowanie PDF
+            #  Paczki trafiają do ProcessPoolExecutor od razu po zbudowaniu –
+            #  workery renderują, gdy główny proces buduje kolejne payloady
             # =============================================================
-            from concurrent.futures import ProcessPoolExecutor, as_completed
-
-            print(f"\n⚡ Renderowanie {len(payloads)} PDF-ów ({MAX_WORKERS} procesów)...")
+            from concurrent.futures import (
+                ProcessPoolExecutor, as_completed, wait, FIRST_COMPLETED,
+            )
 
-            render_args = [(p, LOGO_PATH) for p, _ in payloads]
-
-            with ProcessPoolExecutor(max_workers=MAX_WORKERS) as pool:
-                futures = {
-                    pool.submit(_render_pdf_task, arg): payloads[i][1]
-                    for i, arg in enumerate(render_args)
-                }
-                done_count = 0
-                for future in as_completed(futures):
-                    task_info = futures[future]
-                    rt, nr, lok, pla, cid = task_info
+            total_tasks = len(pdf_tasks)
+            log.info(f"\n📦 Budowanie {total_tasks} payloadów + renderowanie PDF-ów ({MAX_WORKERS} procesów)...")
+
+            # Log CSV zapisywany w tle, równolegle z budowaniem i renderowaniem
+            csv_log = CsvLogWriter(os.path.join(
+                get_output_folder(),
+                f"generation_log_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+            ))
+            # Paczki zadań – mniej round-tripów IPC przy tysiącach PDF-ów
+            chunksize = render_chunksize(total_tasks, MAX_WORKERS)
+
+            pool = ProcessPoolExecutor(
+                max_workers=MAX_WORKERS,
+                initializer=_pool_init,
+                initargs=(font_bytes, run_date()),
+            )
+            futures = {}        # future -> (lista task_info, bloki shm)
+            chunk_args, chunk_infos, chunk_shms = [], [], []
+            # Limit paczek w puli naraz – payloady czekające na worker (pickle
+            # i bloki shm) nie rosną z liczbą raportów, tylko z liczbą workerów
+            max_in_flight = MAX_WORKERS * 2
+
+            def collect_done(done):
+                """Zbiera wyniki zakończonych paczek i zwalnia ich shm."""
+                for future in done:
+                    infos, shms = futures.pop(future)
                     try:
-                        path = future.result(timeout=120)
+                        results = future.result()
+                    except Exception as e:
+                        results = [(None, str(e))] * len(infos)
+                    for shm in shms:
+                        shm.close()
+                        shm.unlink()
+                    for (rt, nr, lok, pla, cid), (path, error) in zip(infos, results):
+                        if error is not None:
+                            log.warning(f"  X render {rt.value} nr={nr}: {error}")
+                            continue
                         all_generated.append(path)
-                        done_count += 1
-                        if done_count % 100 == 0:
-                            print(f"   ✓ {done_count}/{len(payloads)} gotowych")
+                        if len(all_generated) % 100 == 0:
+                            log.info(f"   ✓ {len(all_generated)}/{total_tasks} gotowych")
+
+            def submit_chunk():
+                if len(futures) >= max_in_flight:
+                    done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                    collect_done(done)
+                future = pool.submit(_render_pdf_chunk, chunk_args[:])
+                futures[future] = (chunk_infos[:], chunk_shms[:])
+                chunk_args.clear()
+                chunk_infos.clear()
+                chunk_shms.clear()
+
+            try:
+                for idx, (rt, nr, lok, pla, cid) in enumerate(pdf_tasks, 1):
+                    try:
+                        payload = factory.build_report_payload(
+                            rt, nr, lokalizacja=lok, pla=pla, contract_id=cid,
+                        )
+
+                        # --- Wiersz CSV w kolejności zadań; komórki tabel spłaszcza wątek logu ---
+                        csv_row = {
+                            'plik': payload['filename'],
+                            'typ_raportu': rt.value,
+                            'nr_umowy': nr,
+                            'lokalizacja': lok or '',
+                            'pla': pla or '',
+                            'id': cid or '',
+                            'klient': payload['client_name'],
+                        }
+
+                        # Duże payloady → shared memory (worker dostaje tylko nazwę bloku)
+                        shm, ref = publish_payload(payload)
+                        if shm is not None:
+                            chunk_shms.append(shm)
+                        chunk_args.append((ref, LOGO_PATH))
+                        csv_log.write(csv_row, payload)
+                        chunk_infos.append((rt, nr, lok, pla, cid))
+                        if len(chunk_args) >= chunksize:
+                            submit_chunk()
+
                     except Exception as e:
-                        print(f"  X render {rt.value} nr={nr}: {e}")
-
-            # --- Zapisz log CSV ---
-            if csv_log_rows:
-                csv_path = os.path.join(
-                    get_output_folder(),
-                    f"generation_log_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
-                )
-                all_keys = []
-                for row in csv_log_rows:
-                    for k in row:
-                        if k not in all_keys:
-                            all_keys.append(k)
-                with open(csv_path, 'w', newline='', encoding='utf-8-sig') as f:
-                    writer = csv.DictWriter(f, fieldnames=all_keys, delimiter=';')
-                    writer.writeheader()
-                    writer.writerows(csv_log_rows)
-                print(f"\n📊 Log CSV: {csv_path}")
-
-            print(f"\n{'─' * 50}")
-            print(f"✓ Wygenerowano {len(all_generated)} raportów")
-            for path in all_generated:
-                print(f"   → {os.path.basename(path)}")
+                        log.warning(f"  X {rt.value} nr={nr}: {e}")
+                        err_row = {
+                            'plik': 'BŁĄD',
+                            'typ_raportu': rt.value,
+                            'nr_umowy': nr,
+                            'lokalizacja': lok or '',
+                            'pla': pla or '',
+                            'id': cid or '',
+                            'klient': '',
+                            'error': str(e),
+                        }
+                        csv_log.write(err_row)
+
+                if chunk_args:
+                    submit_chunk()
+
+                # Zamknij połączenie z bazą — dane już w pamięci
+                log.info(f"   ♻️  Cache wyników: {factory.cache_stats()}")
+                factory.close()
+                factory = None
+
+                log.info(f"\n⚡ Oczekiwanie na {total_tasks} PDF-ów...")
+                collect_done(as_completed(futures))
+            finally:
+                pool.shutdown(wait=True)
+                for _, shms in futures.values():
+                    for shm in shms:
+                        shm.close()
+                        shm.unlink()
+                for shm in chunk_shms:
+                    shm.close()
+                    shm.unlink()
+
+            # --- Zamknij log CSV ---
+            csv_path = csv_log.close()
+            csv_log = None
+            if csv_path:
+                log.info(f"\n📊 Log CSV: {csv_path}")
+
+            log.info(f"\n{'─' * 50}")
+            log.info(f"✓ Wygenerowano {len(all_generated)} raportów")
+            # Lista plików jednym komunikatem (jeden zapis zamiast N)
+            if all_generated and log.isEnabledFor(logging.DEBUG):
+                log.debug("\n".join(
+                    f"   → {os.path.basename(path)}" for path in all_generated
+                ))
         except Exception as e:
-            print(f"\n✗ Błąd: {e}")
-            import traceback
-            traceback.print_exc()
+            log.exception(f"\n✗ Błąd: {e}")
         finally:
             if factory:
                 factory.close()
+            if csv_log:
+                csv_log.close()
 
-    print(f"\n📁 Folder: {get_output_folder()}")
-    print(f"⏱️  Czas: {total.formatted()}")
+    log.info(f"\n📁 Folder: {get_output_folder()}")
+    log.info(f"⏱️  Czas: {total.formatted()}")
+    log_listener.stop()
 
@@ -9,9 +9,15 @@ Aby przełączyć na prawdziwą bazę:
   3. Upewnij się, że hdbcli jest zainstalowane
 """
 
+import logging
 import random
+import re
 import string
-from typing import List, Any, Optional
+from itertools import islice
+from functools import lru_cache
+from typing import Iterable, List, Any, Optional
+
+log = logging.getLogger('raporty')
 
 
 # =========================================================================
@@ -27,6 +33,9 @@ MOCK_CONTRACTS = [
     {"nr_umowy": "UM-2026-005", "klient": "SuperShop Sp. z o.o.",  "podtyp_klient": "B"},
 ]
 
+# Indeks umów po nr_umowy – wyszukiwanie O(1) zamiast skanu listy
+MOCK_CONTRACTS_BY_NR = {c["nr_umowy"]: c for c in MOCK_CONTRACTS}
+
 # Sklepy pogrupowane wg grupa_umowa (x, y, z)
 MOCK_SHOPS = {
     "x": [
@@ -50,25 +59,24 @@ MOCK_SHOPS = {
 }
 
 
+# Własny generator ze stałym seedem – dane mockowe powtarzalne między
+# uruchomieniami, bez wpływu na globalny moduł random
+_rng = random.Random(0)
+
+
 def _rand_currency(lo: float = 1000, hi: float = 50000) -> float:
     """Losowa kwota PLN."""
-    return round(random.uniform(lo, hi), 2)
+    return round(_rng.uniform(lo, hi), 2)
 
 
 def _rand_pct(lo: float = 0.5, hi: float = 15.0) -> float:
     """Losowy procent."""
-    return round(random.uniform(lo, hi), 2)
+    return round(_rng.uniform(lo, hi), 2)
 
 
 def _generate_summary_row(nr_umowy: str) -> list:
     """Generuje wiersz podsumowania (Tabela 1 – 8 kolumn)."""
-    contract = None
-    for c in MOCK_CONTRACTS:
-        if c["nr_umowy"] == nr_umowy:
-            contract = c
-            break
-    if contract is None:
-        contract = MOCK_CONTRACTS[0]
+    contract = MOCK_CONTRACTS_BY_NR.get(nr_umowy, MOCK_CONTRACTS[0])
 
     return [
         nr_umowy,                           # Nr umowy
@@ -92,9 +100,10 @@ def _generate_header_table_row(nr_umowy: str) -> list:
     return [rabat1, rabat2, udzielony, wartosc, wyplata]
 
 
-def _generate_shop_rows(grupa_umowa: str, nr_umowy: str) -> List[list]:
+@lru_cache(maxsize=None)
+def _shop_rows_cached(grupa_umowa: str) -> tuple:
     """
-    Generuje wiersze Tabeli 3 dla danej grupy umowy.
+    Wiersze Tabeli 3 dla grupy umowy – losowane RAZ per grupa (krotki).
     Kolumny: nazwa_sklepu, grupa_umowa, klasyfikacja, typ_lok,
              podstawa, bonus%, wyprac%, bonus_lacz%, wartosc_bonus,
              udzielony_rabat, wartosc_do_wyr
@@ -110,7 +119,7 @@ def _generate_shop_rows(grupa_umowa: str, nr_umowy: str) -> List[list]:
         udzielony_rabat = round(podstawa * _rand_pct(0.1, 3.0) / 100, 2)
         wartosc_do_wyr = round(wartosc_bonus - udzielony_rabat, 2)
 
-        rows.append([
+        rows.append((
             shop["nazwa_sklepu"],
             grupa_umowa,
             shop["klasyfikacja"],
@@ -122,19 +131,24 @@ def _generate_shop_rows(grupa_umowa: str, nr_umowy: str) -> List[list]:
             wartosc_bonus,
             udzielony_rabat,
             wartosc_do_wyr,
-        ])
-    return rows
+        ))
+    return tuple(rows)
+
+
+def _generate_shop_rows(grupa_umowa: str, nr_umowy: str) -> Iterable[list]:
+    """Wiersze Tabeli 3 dla danej grupy umowy – kopie z cache, leniwie."""
+    return (list(r) for r in _shop_rows_cached(grupa_umowa))
 
 
 def _generate_shop_rows_single(grupa_umowa: str, nr_umowy: str, lokalizacja: str) -> List[list]:
     """
     Generuje wiersze Tabeli 3 ale tylko dla wybranej lokalizacji (Typ B).
     """
-    all_rows = _generate_shop_rows(grupa_umowa, nr_umowy)
+    all_rows = _shop_rows_cached(grupa_umowa)
     # Filtruj do wybranej lokalizacji; jeśli nie znaleziono – zwróć pierwszy
-    filtered = [r for r in all_rows if r[0] == lokalizacja]
+    filtered = [list(r) for r in all_rows if r[0] == lokalizacja]
     if not filtered and all_rows:
-        filtered = [all_rows[0]]
+        filtered = [list(all_rows[0])]
     return filtered
 
 
@@ -142,9 +156,19 @@ def _generate_shop_rows_single(grupa_umowa: str, nr_umowy: str, lokalizacja: str
 #  MAPOWANIE ZAPYTAŃ → DANYCH
 # =========================================================================
 
-def _resolve_query(query: str) -> List[list]:
+# CALL SCHEMA.PROC_<rodzaj>_WYKONANIE_<...>[_<grupa>][_LOK]('<nr>'[, '<lok>'])
+# – rodzaj, grupa, znacznik _LOK i parametry jednym dopasowaniem
+_PROC_RE = re.compile(
+    r"PROC_(SUMMARY|HEADER|SKLEPY)_WYKONANIE\w*?(?:_([XYZ]))?(_LOK)?"
+    r"\(\s*['\"]?([^,'\")]*)['\"]?(?:\s*,\s*['\"]?([^'\")]*)['\"]?)?\s*\)",
+    re.IGNORECASE,
+)
+
+
+def _resolve_query(query: str) -> Iterable[list]:
     """
-    Rozpoznaje zapytanie SQL / CALL i zwraca odpowiednie dane mockowe.
+    Rozpoznaje zapytanie SQL / CALL i zwraca odpowiednie dane mockowe
+    (iterowalne – kursor pobiera tylko tyle wierszy, ile użyje).
     Obsługiwane wzorce:
       - SELECT DISTINCT nr_umowy, klient, podtyp_klient ...
       - CALL SCHEMA.PROC_SUMMARY_WYKONANIE_A({nr})
@@ -152,85 +176,43 @@ def _resolve_query(query: str) -> List[list]:
       - CALL SCHEMA.PROC_SKLEPY_WYKONANIE_A_{x|y|z}({nr})
       - CALL SCHEMA.PROC_SKLEPY_WYKONANIE_A_{x|y|z}_LOK({nr}, '{lok}')
     """
-    q = query.strip().upper()
+    q = query.upper()
 
     # --- Lista umów ---
     if "SELECT" in q and "NR_UMOWY" in q and "KLIENT" in q:
-        return [
+        return (
             [c["nr_umowy"], c["klient"], c["podtyp_klient"]]
             for c in MOCK_CONTRACTS
-        ]
-
-    # --- Podsumowanie (Tabela 1) ---
-    if "PROC_SUMMARY_WYKONANIE" in q:
-        # wyciągnij nr_umowy z parametru
-        nr = _extract_param(query)
-        return [_generate_summary_row(nr)]
-
-    # --- Nagłówek duży (Tabela 2) ---
-    if "PROC_HEADER_WYKONANIE" in q:
-        nr = _extract_param(query)
-        return [_generate_header_table_row(nr)]
-
-    # --- Sklepy – pojedyncza lokalizacja (Typ B) ---
-    if "PROC_SKLEPY_WYKONANIE" in q and "_LOK" in q:
-        nr = _extract_first_param(query)
-        lok = _extract_second_param(query)
-        grupa = _extract_grupa(query)
-        return _generate_shop_rows_single(grupa, nr, lok)
-
-    # --- Sklepy – wszystkie (Typ A) ---
-    if "PROC_SKLEPY_WYKONANIE" in q:
-        nr = _extract_param(query)
-        grupa = _extract_grupa(query)
+        )
+
+    m = _PROC_RE.search(query)
+    if m is not None:
+        kind, grupa, is_lok, nr, lok = m.groups()
+        kind = kind.upper()
+        nr = nr.strip()
+
+        # --- Podsumowanie (Tabela 1) ---
+        if kind == "SUMMARY":
+            return [_generate_summary_row(nr)]
+
+        # --- Nagłówek duży (Tabela 2) ---
+        if kind == "HEADER":
+            return [_generate_header_table_row(nr)]
+
+        grupa = grupa.lower() if grupa else "x"
+
+        # --- Sklepy – pojedyncza lokalizacja (Typ B) ---
+        if is_lok:
+            return _generate_shop_rows_single(grupa, nr, (lok or "").strip())
+
+        # --- Sklepy – wszystkie (Typ A) ---
         return _generate_shop_rows(grupa, nr)
 
     # --- Fallback ---
-    print(f"  ⚠️  Mock: nierozpoznane zapytanie: {query}")
+    log.warning(f"  ⚠️  Mock: nierozpoznane zapytanie: {query}")
     return []
 
 
-def _extract_param(query: str) -> str:
-    """Wyciąga parametr z CALL PROC(param)."""
-    try:
-        start = query.index("(") + 1
-        end = query.index(")")
-        return query[start:end].strip().strip("'\"")
-    except ValueError:
-        return ""
-
-
-def _extract_first_param(query: str) -> str:
-    """Wyciąga pierwszy parametr z CALL PROC(p1, p2)."""
-    try:
-        start = query.index("(") + 1
-        end = query.index(")")
-        params = query[start:end].split(",")
-        return params[0].strip().strip("'\"")
-    except (ValueError, IndexError):
-        return ""
-
-
-def _extract_second_param(query: str) -> str:
-    """Wyciąga drugi parametr z CALL PROC(p1, p2)."""
-    try:
-        start = query.index("(") + 1
-        end = query.index(")")
-        params = query[start:end].split(",")
-        return params[1].strip().strip("'\"") if len(params) > 1 else ""
-    except (ValueError, IndexError):
-        return ""
-
-
-def _extract_grupa(query: str) -> str:
-    """Wyciąga grupę umowy (x/y/z) z nazwy procedury."""
-    q = query.upper()
-    for g in ["_Z(", "_Z_", "_Y(", "_Y_", "_X(", "_X_"]:
-        if g in q:
-            return g[1].lower()
-    return "x"
-
-
 # =========================================================================
 #  MOCK KLAS hdbcli.dbapi
 # =========================================================================
@@ -238,18 +220,31 @@ def _extract_grupa(query: str) -> str:
 class MockCursor:
     """Symuluje hdbcli cursor."""
 
+    __slots__ = ('_rows', '_description', 'arraysize')
+
     def __init__(self):
-        self._results: List[list] = []
+        self._rows = iter(())
         self._description = None
+        self.arraysize = 1
+
+    def setfetchsize(self, value: int):
+        self.arraysize = value
 
-    def execute(self, query: str):
-        self._results = _resolve_query(query)
+    def execute(self, query: str, params: list = None):
+        # Parametry wiązane (?) podstawiane jako literały – dla rozpoznania zapytania
+        for value in params or []:
+            query = query.replace('?', f"'{value}'", 1)
+        # Wiersze generowane leniwie – fetchone nie buduje całego wyniku
+        self._rows = iter(_resolve_query(query))
 
     def fetchall(self) -> List[list]:
-        return self._results
+        return list(self._rows)
+
+    def fetchmany(self, size: int = None) -> List[list]:
+        return list(islice(self._rows, size or self.arraysize))
 
     def fetchone(self) -> Optional[list]:
-        return self._results[0] if self._results else None
+        return next(self._rows, None)
 
     def close(self):
         pass
@@ -258,6 +253,8 @@ class MockCursor:
 class MockConnection:
     """Symuluje hdbcli connection."""
 
+    __slots__ = ('_config',)
+
     def __init__(self, **kwargs):
         self._config = kwargs
 
@@ -273,7 +270,7 @@ class MockDbApi:
 
     @staticmethod
     def connect(**kwargs) -> MockConnection:
-        print("  🔌 Mock HANA: połączono (symulacja)")
+        log.info("  🔌 Mock HANA: połączono (symulacja)")
         return MockConnection(**kwargs)
 
 
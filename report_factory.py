@@ -5,22 +5,33 @@ Obsługuje zapytania SELECT jako źródło danych.
 Jeden numer = jeden PDF. Zmiana numeru = nowy plik PDF.
 
 OPTYMALIZACJE:
-  1. Jedno połączenie na cały run (connection pooling)
+  1. Pula połączeń otwieranych raz na cały run (HanaPool)
   2. Batch query – każde zapytanie wykonywane RAZ (bez WHERE nr_umowy),
      wyniki cache'owane i filtrowane w Pythonie
   3. Cache summary/header – identyczne zapytania nie powtarzają się
 """
 
 import re
-import yaml
+import sys
+import pickle
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict
+from contextlib import contextmanager
+from functools import lru_cache
+from operator import itemgetter
 from pathlib import Path
-from typing import List, Dict, Any, Optional, Tuple
+from typing import List, Dict, Any, Iterable, Optional, Tuple
 from datetime import datetime
 import os
 
+import logging
+
 from main import (
     get_hana_connection,
     Timer,
+    log,
 )
 
 from report_types import ReportType
@@ -30,36 +41,354 @@ from report_types import ReportType
 #  PARAMETRYZACJA ZAPYTAŃ SQL
 # ======================================================================
 
+# Placeholder w apostrofach ('{nr}') lub bez (CALL PROC({nr}))
+_PLACEHOLDER_RE = re.compile(r"'\{(nr|lok)\}'|\{(nr|lok)\}")
+
+
+@lru_cache(maxsize=256)
+def _resolve_template(query: str, with_nr: bool, with_lok: bool) -> Tuple[str, Tuple[str, ...]]:
+    """
+    Szablon → (SQL z ?, kolejność parametrów) – liczone RAZ per szablon.
+    Ten sam tekst SQL dla każdego nr = jeden plan w cache HANA.
+    Jeden przebieg regexu: każde wystąpienie placeholdera z wartością → ?,
+    nazwy parametrów w kolejności wystąpień.
+    """
+    present = {'nr': with_nr, 'lok': with_lok}
+    names = []
+
+    def _bind(m):
+        name = m.group(1) or m.group(2)
+        if not present[name]:
+            return m.group(0)
+        names.append(name)
+        return '?'
+
+    sql = _PLACEHOLDER_RE.sub(_bind, query).strip()
+    log.debug("    SQL (szablon): %s", sql)
+    return sql, tuple(names)
+
+
+# Literał '...' / identyfikator "..." (zostają bez zmian), początek
+# komentarza SQL albo ciąg białych znaków
+_SQL_WS_RE = re.compile(r"('(?:[^']|'')*'|\"[^\"]*\")|(--|/\*)|\s+")
+
+
+@lru_cache(maxsize=256)
+def _canonical_query(query: str) -> str:
+    """
+    Postać kanoniczna zapytania – klucz cache: białe znaki poza literałami
+    zwinięte do jednej spacji, więc zapytania z YAML różniące się tylko
+    wcięciem / końcem linii współdzielą wynik i jedno wywołanie w HANA.
+    Zapytania z komentarzami (--, /* */) – tylko strip (zwinięcie linii
+    zmieniłoby zasięg komentarza).
+    """
+    has_comment = False
+
+    def _collapse(m):
+        nonlocal has_comment
+        if m.group(1):
+            return m.group(1)
+        if m.group(2):
+            has_comment = True
+            return m.group(2)
+        return ' '
+
+    canonical = _SQL_WS_RE.sub(_collapse, query).strip()
+    return query.strip() if has_comment else canonical
+
+
 def _parameterize_query(query: str, nr: str = None,
                         lokalizacja: str = None) -> tuple:
     """
-    Zamienia placeholdery {nr}/{lok} na parametry wiązane (?).
+    Zamienia placeholdery {nr}/{lok} (w apostrofach lub bez – np. w CALL)
+    na parametry wiązane (?).
     Zwraca (query_z_?, lista_parametrów) — bezpieczne przed SQL injection.
     """
-    params = []
-    result = query
+    sql, names = _resolve_template(query, nr is not None, lokalizacja is not None)
+    values = {'nr': nr, 'lok': lokalizacja}
+    return sql, [str(values[name]) for name in names]
+
+
+# ======================================================================
+#  STRUMIENIOWE POBIERANIE WIERSZY
+# ======================================================================
 
-    # Zbierz pozycje placeholderów i posortuj wg pozycji
-    replacements = []
-    if nr is not None and "'{nr}'" in result:
-        replacements.append(("'{nr}'", str(nr), result.find("'{nr}'")))
-    if lokalizacja is not None and "'{lok}'" in result:
-        replacements.append(("'{lok}'", str(lokalizacja), result.find("'{lok}'")))
+FETCH_BATCH = 1000
 
-    # Sortuj wg pozycji w query (zachowaj kolejność parametrów)
-    replacements.sort(key=lambda x: x[2])
+# Paczka dla dużych wyników (batch bez filtrów, lista umów) – mniej
+# round-tripów; małe wywołania per umowa zostają przy FETCH_BATCH
+FETCH_BATCH_LARGE = 10000
+
+# Limit placeholderów w jednym IN (...) – bezpieczny dla większości baz
+IN_LIST_MAX = 999
+
+
+def _tune_cursor(cursor, fetch_size: int = FETCH_BATCH):
+    """
+    Ustawia prefetch kursora: arraysize (DB-API) i setfetchsize (hdbcli) –
+    jeden round-trip sieciowy na paczkę wierszy zamiast domyślnej małej.
+    """
+    try:
+        cursor.arraysize = fetch_size
+    except Exception:
+        pass
+    setfetchsize = getattr(cursor, 'setfetchsize', None)
+    if setfetchsize is not None:
+        try:
+            setfetchsize(fetch_size)
+        except Exception:
+            pass
 
-    for placeholder, value, _ in replacements:
-        result = result.replace(placeholder, '?', 1)
-        params.append(value)
 
-    return result.strip(), params
+def _stringify_row(row) -> List[str]:
+    """Wiersz jako stringi (NULL → ''); bez NULL-i – map(str) bez warunku per komórka."""
+    if None not in row:
+        return list(map(str, row))
+    return [str(cell) if cell is not None else '' for cell in row]
+
+
+def _iter_rows(cursor, batch: int = FETCH_BATCH):
+    """
+    Pobiera wiersze paczkami (fetchmany) i od razu zamienia na stringi –
+    w pamięci nie ma naraz całego surowego wyniku i jego kopii tekstowej.
+    """
+    while True:
+        rows = cursor.fetchmany(batch)
+        if not rows:
+            return
+        # Pętla po wierszach paczki w C (map) – Python tylko konwertuje wiersz
+        yield from map(_stringify_row, rows)
+
+
+def _estimate_rows_bytes(rows: List[list], sample: int = 64) -> int:
+    """Przybliżony rozmiar wyniku w pamięci – z próbki wierszy (bez pełnego skanu)."""
+    if not rows:
+        return sys.getsizeof(rows)
+    picked = rows[::max(1, len(rows) // sample)][:sample]
+    per_row = sum(
+        sys.getsizeof(row) + sum(map(sys.getsizeof, row)) for row in picked
+    ) / len(picked)
+    return sys.getsizeof(rows) + int(per_row * len(rows))
+
+
+def _estimate_view_bytes(rows: List[list], sample: int = 64) -> int:
+    """
+    Jak _estimate_rows_bytes, ale tylko listy – wartości są współdzielone
+    z wynikiem batch, z którego zbudowano widok (liczone już tam).
+    """
+    if not rows:
+        return sys.getsizeof(rows)
+    picked = rows[::max(1, len(rows) // sample)][:sample]
+    per_row = sum(map(sys.getsizeof, picked)) / len(picked)
+    return sys.getsizeof(rows) + int(per_row * len(rows))
+
+
+def stream_query(conn, sql: str, params: list = None, batch: int = FETCH_BATCH):
+    """Wykonuje zapytanie i zwraca generator wierszy (List[str]) paczkami po `batch`."""
+    cursor = conn.cursor()
+    _tune_cursor(cursor, batch)
+    try:
+        if params:
+            cursor.execute(sql, params)
+        else:
+            cursor.execute(sql)
+        yield from _iter_rows(cursor, batch)
+    finally:
+        cursor.close()
+
+
+# ======================================================================
+#  CACHE KONFIGURACJI
+# ======================================================================
+
+# Sparsowane YAML-e zapisywane obok konfiguracji (pickle) – kolejne
+# uruchomienia czytają pickle, dopóki nazwy/mtime/rozmiary plików się zgadzają
+CONFIG_CACHE_NAME = '.cache.pkl'
+
+
+# Konfiguracje w pamięci procesu: ścieżka → ((mtime_ns, rozmiar), konfiguracja).
+# Kolejne ReportFactory w tym samym procesie nie czytają ani YAML, ani pickle.
+# Konfiguracje są tylko czytane – współdzielone bez kopii.
+_YAML_CACHE: "OrderedDict[str, tuple]" = OrderedDict()
+YAML_CACHE_MAX = 100
+
+# Limit zapamiętanych wyników zapytań w ReportFactory (LRU) – zadania idą
+# umowa po umowie, więc wystarcza na typy raportów jednej umowy z zapasem
+RESULT_CACHE_MAX = 512
+
+# Budżet pamięci wyników w QueryCache (szacunek, bajty) – batch i CALL
+# per (nr, lok) razem; ponad nim wypadają najdawniej używane wpisy,
+# a get() dla nich pyta HANA wprost
+BATCH_CACHE_MAX_BYTES = 512 * 1024 * 1024
+
+# Separatory ścieżek w częściach nazwy pliku PDF → '_' (jedno przejście)
+_FILENAME_TRANS = str.maketrans({'/': '_', '\\': '_'})
+
+
+def _parse_yaml(path: Path) -> dict:
+    """
+    Parsuje plik YAML parserem libyaml (C), gdy PyYAML ma go wkompilowanego.
+    Import yaml dopiero tutaj – przy aktualnym cache (pickle / pamięć)
+    moduł nie jest ładowany wcale (~30 ms startu mniej).
+    """
+    import yaml
+    loader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+    with open(path, 'r', encoding='utf-8') as f:
+        return yaml.load(f, Loader=loader)
+
+
+def _config_signature(config_dir: Path) -> Dict[str, tuple]:
+    """Sygnatura plików YAML: {nazwa: (mtime_ns, rozmiar)}."""
+    sig = {}
+    for path in sorted(config_dir.glob('*.yaml')):
+        st = path.stat()
+        sig[path.name] = (st.st_mtime_ns, st.st_size)
+    return sig
+
+
+def _yaml_cache_get(path: Path, file_sig: tuple) -> Optional[dict]:
+    """Konfiguracja z cache procesu – None gdy brak lub plik się zmienił."""
+    key = str(path.resolve())
+    entry = _YAML_CACHE.get(key)
+    if entry is None or entry[0] != file_sig:
+        return None
+    _YAML_CACHE.move_to_end(key)
+    return entry[1]
+
+
+def _yaml_cache_put(path: Path, file_sig: tuple, cfg: dict) -> None:
+    """Zapamiętuje konfigurację (LRU, najwyżej YAML_CACHE_MAX plików)."""
+    key = str(path.resolve())
+    _YAML_CACHE[key] = (file_sig, cfg)
+    _YAML_CACHE.move_to_end(key)
+    while len(_YAML_CACHE) > YAML_CACHE_MAX:
+        _YAML_CACHE.popitem(last=False)
+
+
+def _read_config_cache(config_dir: Path, sig: Dict[str, tuple]) -> Optional[Dict[str, dict]]:
+    """Konfiguracje z pickle – None gdy brak pliku lub sygnatura nieaktualna."""
+    try:
+        with open(config_dir / CONFIG_CACHE_NAME, 'rb') as f:
+            cached = pickle.load(f)
+    except Exception:
+        return None
+    if not isinstance(cached, dict) or cached.get('sig') != sig:
+        return None
+    return cached.get('configs')
+
+
+def _write_config_cache(config_dir: Path, sig: Dict[str, tuple],
+                        configs: Dict[str, dict]) -> None:
+    """Zapisuje pickle atomowo; folder tylko do odczytu = po prostu bez cache."""
+    path = config_dir / CONFIG_CACHE_NAME
+    tmp = path.with_name(path.name + '.tmp')
+    try:
+        with open(tmp, 'wb') as f:
+            pickle.dump({'sig': sig, 'configs': configs}, f,
+                        protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+    except OSError:
+        pass
+
+
+# ======================================================================
+#  PULA POŁĄCZEŃ
+# ======================================================================
+
+class HanaPool:
+    """
+    Pula N otwartych połączeń HANA – sesje otwierane RAZ (od razu wszystkie),
+    zapytania wypożyczają połączenie / kursor i oddają je po użyciu.
+    """
+
+    def __init__(self, size: int = 1, connections: list = None):
+        """
+        Args:
+            size: Liczba połączeń do otwarcia (gdy nie podano connections)
+            connections: Gotowe połączenia – pula ich nie zamyka
+        """
+        self._owns = connections is None
+        if connections is None:
+            connections = [get_hana_connection() for _ in range(max(1, size))]
+        self._all = list(connections)
+        self._idle: queue.LifoQueue = queue.LifoQueue()
+        for conn in self._all:
+            self._idle.put(conn)
+
+    @property
+    def size(self) -> int:
+        return len(self._all)
+
+    def _revive(self, conn):
+        """
+        Zwraca żywe połączenie: zerwaną sesję (hdbcli isconnected() == False)
+        zastępuje nową – raz, przy wypożyczeniu. Połączeń z zewnątrz nie rusza.
+        """
+        isconnected = getattr(conn, 'isconnected', None)
+        if not self._owns or isconnected is None or isconnected():
+            return conn
+        log.warning("  🔌 Połączenie HANA zerwane – ponowne łączenie")
+        try:
+            conn.close()
+        except Exception:
+            pass
+        fresh = get_hana_connection()
+        self._all[self._all.index(conn)] = fresh
+        return fresh
+
+    @contextmanager
+    def connection(self):
+        """Wypożycza połączenie (czeka, gdy wszystkie zajęte)."""
+        conn = self._idle.get()
+        try:
+            conn = self._revive(conn)
+            yield conn
+        finally:
+            self._idle.put(conn)
+
+    @contextmanager
+    def cursor(self):
+        """Kursor na wypożyczonym połączeniu – zamykany, połączenie wraca do puli."""
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            _tune_cursor(cursor)
+            try:
+                yield cursor
+            finally:
+                cursor.close()
+
+    def close(self):
+        """Zamyka połączenia otwarte przez pulę."""
+        if self._owns:
+            for conn in self._all:
+                conn.close()
+        self._all = []
 
 
 # ======================================================================
 #  BATCH QUERY ENGINE
 # ======================================================================
 
+# Wzorce przepisywania WHERE w _make_base_query – kompilowane raz.
+# Obsługują zarówno placeholdery {nr}/{lok} jak i literały 'wartość'.
+_NR_FILTER = r"nr_umowy\s*=\s*(?:'\{nr\}'|'[^']*')"
+_LOK_FILTER = r"nazwa_sklepu\s*=\s*(?:'\{lok\}'|'[^']*')"
+_RE_NR = re.compile(_NR_FILTER, re.IGNORECASE)
+_RE_AND_NR = re.compile(r"\s+AND\s+" + _NR_FILTER, re.IGNORECASE)
+_RE_NR_AND = re.compile(_NR_FILTER + r"\s*AND\s*", re.IGNORECASE)
+_RE_LOK = re.compile(_LOK_FILTER, re.IGNORECASE)
+_RE_AND_LOK = re.compile(r"\s+AND\s+" + _LOK_FILTER, re.IGNORECASE)
+_RE_LOK_AND = re.compile(_LOK_FILTER + r"\s*AND\s*", re.IGNORECASE)
+_RE_WHERE_1_TAIL = re.compile(r"WHERE\s+1=1\s*$", re.IGNORECASE)
+_RE_WHERE_1_AND = re.compile(r"WHERE\s+1=1\s+AND\s+", re.IGNORECASE)
+# SELECT [DISTINCT] kolumny | FROM ... – jedno dopasowanie: odczyt kolumn
+# i wstawienie kolumn filtrujących bez ponownego skanowania zapytania
+_RE_SELECT_FULL = re.compile(r'SELECT\s+(DISTINCT\s+)?(.+?)(\s+FROM.*)',
+                             re.IGNORECASE | re.DOTALL)
+# Kolumna bez wyrażenia (nazwa lub tabela.nazwa) – warunek scalania zapytań
+_RE_SIMPLE_COL = re.compile(r'[A-Za-z_][\w.]*$')
+
+
 class QueryCache:
     """
     Cache zapytań – wykonuje każde zapytanie RAZ na cały zbiór danych,
@@ -72,9 +401,26 @@ class QueryCache:
     # Kolumna wg której filtrujemy nr_umowy (indeks w wynikach)
     NR_UMOWY_FILTER_COL = 'nr_umowy'
 
-    def __init__(self, connection):
-        self._conn = connection
-        self._cache: Dict[str, List[list]] = {}  # base_query → all rows
+    def __init__(self, pool: HanaPool):
+        self._pool = pool
+        # Jedno LRU z budżetem BATCH_CACHE_MAX_BYTES:
+        #   template → wszystkie wiersze batch (_cache_bytes obejmuje też
+        #              grupy i widoki szablonu)
+        #   (template, nr, lok) → wiersze zapytania per wywołanie (CALL)
+        self._cache: "OrderedDict[Any, List[list]]" = OrderedDict()
+        self._cache_bytes: Dict[str, int] = {}
+        self._cache_total = 0
+        self._batch_hits = 0
+        self._batch_misses = 0
+        self._evicted = 0
+        self._evicted_calls = 0
+        # Wątki _prefetch_calls zapisują do LRU równolegle
+        self._lock = threading.Lock()
+        # template → {(po_nr, po_lok): {(nr, lok): wiersze wyniku batch}}
+        self._buckets: Dict[str, Dict[tuple, Dict[tuple, List[list]]]] = {}
+        # template → {(po_nr, po_lok, klucz): grupa bez dodanych kolumn} –
+        # budowane dopiero przy pierwszym get()
+        self._views: Dict[str, Dict[tuple, List[list]]] = {}
         self._base_query_cache: Dict[str, tuple] = {}  # template → (base_q, nr_col, lok_col, added)
         self._query_count = 0
 
@@ -82,6 +428,71 @@ class QueryCache:
     def query_count(self) -> int:
         return self._query_count
 
+    def cache_stats(self) -> str:
+        """Trafienia i zajętość cache wyników batch ('' gdy batch nie był używany)."""
+        total = self._batch_hits + self._batch_misses
+        if not total and not self._cache:
+            return ''
+        n_calls = sum(1 for key in self._cache if isinstance(key, tuple))
+        mb = self._cache_total / (1024 * 1024)
+        return (f"batch {self._batch_hits}/{total} trafień, "
+                f"{len(self._cache) - n_calls} szablonów + {n_calls} wyników CALL "
+                f"(~{mb:.1f} MB), {self._evicted} wyrzuconych")
+
+    def _store(self, key, rows: List[list]):
+        """
+        Zapisuje wynik (szablon batch albo klucz CALL); ponad budżet
+        wypadają najdawniej używane wpisy.
+        """
+        with self._lock:
+            self._drop(key)
+            size = _estimate_rows_bytes(rows)
+            self._cache[key] = rows
+            self._cache_bytes[key] = size
+            self._cache_total += size
+            self._evict_over_budget()
+
+    def _charge(self, template: str, size: int):
+        """Dolicza do szablonu pamięć jego grup / widoków (w budżecie LRU)."""
+        with self._lock:
+            self._cache_bytes[template] += size
+            self._cache_total += size
+            self._evict_over_budget()
+
+    def _evict_over_budget(self):
+        """Wyrzuca najdawniej używane wpisy ponad BATCH_CACHE_MAX_BYTES."""
+        # Najnowszy wynik zostaje zawsze – nawet gdy sam przekracza budżet
+        while self._cache_total > BATCH_CACHE_MAX_BYTES and len(self._cache) > 1:
+            oldest = next(iter(self._cache))
+            if isinstance(oldest, tuple):
+                # Wyniki CALL wypadają setkami – jeden komunikat na przebieg
+                if not self._evicted_calls:
+                    log.info(f"    ♻️  Batch cache: budżet pamięci – wyrzucane "
+                             f"wyniki CALL ({oldest[0][:80]})")
+                self._evicted_calls += 1
+            else:
+                log.info(f"    ♻️  Batch cache: budżet pamięci – wyrzucono {oldest[:80]}")
+            self._drop(oldest)
+            self._evicted += 1
+
+    def _drop(self, key):
+        """Usuwa wpis LRU; dla szablonu batch razem z jego grupami i widokami."""
+        if key not in self._cache:
+            return
+        del self._cache[key]
+        self._cache_total -= self._cache_bytes.pop(key)
+        self._buckets.pop(key, None)
+        self._views.pop(key, None)
+
+    def _touch(self, template: str) -> bool:
+        """True gdy wynik batch jest w cache (i oznacza go jako ostatnio używany)."""
+        if template in self._cache:
+            self._cache.move_to_end(template)
+            self._batch_hits += 1
+            return True
+        self._batch_misses += 1
+        return False
+
     def _make_base_query(self, query: str) -> Tuple[str, Optional[int], Optional[int]]:
         """
         Przekształca zapytanie per-umowa na zapytanie batch (bez filtrów).
@@ -97,54 +508,39 @@ class QueryCache:
         """
         q = query.strip()
 
-        # Wykryj oryginalne filtry (przed podstawieniem {nr}/{lok})
-        # Obsługuje zarówno placeholdery {nr}/{lok} jak i literały 'wartość'
-        _nr_pattern = r"nr_umowy\s*=\s*(?:'\{nr\}'|'[^']*')"
-        _lok_pattern = r"nazwa_sklepu\s*=\s*(?:'\{lok\}'|'[^']*')"
-        has_nr_filter = bool(re.search(_nr_pattern, q, re.IGNORECASE))
-        has_lok_filter = bool(re.search(_lok_pattern, q, re.IGNORECASE))
-
-        # Usuń filtr nr_umowy z WHERE (trzy warianty pozycji w klauzuli)
-        q_clean = re.sub(
-            r"\s+AND\s+" + _nr_pattern,
-            '', q, flags=re.IGNORECASE
-        )
-        q_clean = re.sub(
-            _nr_pattern + r"\s*AND\s*",
-            '', q_clean, flags=re.IGNORECASE
-        )
-        q_clean = re.sub(
-            _nr_pattern,
-            '1=1', q_clean, flags=re.IGNORECASE
-        )
+        # Wykryj oryginalne filtry (przed podstawieniem {nr}/{lok});
+        # test podciągu najpierw – bez nazwy kolumny regex nie ma czego szukać
+        q_lower = q.lower()
+        has_nr_filter = 'nr_umowy' in q_lower and bool(_RE_NR.search(q))
+        has_lok_filter = 'nazwa_sklepu' in q_lower and bool(_RE_LOK.search(q))
+
+        # Usuń filtr nr_umowy z WHERE (trzy warianty pozycji w klauzuli);
+        # bez filtra w szablonie żaden wariant nie pasuje – pomiń przebiegi
+        q_clean = q
+        if has_nr_filter:
+            q_clean = _RE_AND_NR.sub('', q_clean)
+            q_clean = _RE_NR_AND.sub('', q_clean)
+            q_clean = _RE_NR.sub('1=1', q_clean)
 
         # Usuń filtr nazwa_sklepu z WHERE
-        q_clean = re.sub(
-            r"\s+AND\s+" + _lok_pattern,
-            '', q_clean, flags=re.IGNORECASE
-        )
-        q_clean = re.sub(
-            _lok_pattern + r"\s*AND\s*",
-            '', q_clean, flags=re.IGNORECASE
-        )
-        q_clean = re.sub(
-            _lok_pattern,
-            '1=1', q_clean, flags=re.IGNORECASE
-        )
+        if has_lok_filter:
+            q_clean = _RE_AND_LOK.sub('', q_clean)
+            q_clean = _RE_LOK_AND.sub('', q_clean)
+            q_clean = _RE_LOK.sub('1=1', q_clean)
 
         # Wyczyść "WHERE 1=1" jeśli nic innego nie zostało
-        q_clean = re.sub(r"WHERE\s+1=1\s*$", '', q_clean, flags=re.IGNORECASE)
-        q_clean = re.sub(r"WHERE\s+1=1\s+AND\s+", 'WHERE ', q_clean, flags=re.IGNORECASE)
+        q_clean = _RE_WHERE_1_TAIL.sub('', q_clean)
+        q_clean = _RE_WHERE_1_AND.sub('WHERE ', q_clean)
+
+        # Bez filtrów nie ma kolumn do dodania ani indeksów do ustalenia
+        if not (has_nr_filter or has_lok_filter):
+            return q_clean.strip(), None, None, 0
 
         # Dodaj kolumny filtrujące na początek SELECT
         # (tylko jeśli nie ma ich już w SELECT)
         # Obsługa SELECT DISTINCT – zachowaj DISTINCT po dodaniu kolumn
-        has_distinct = bool(re.match(r'\s*SELECT\s+DISTINCT\s+', q_clean, re.IGNORECASE))
-        select_match = re.search(
-            r'SELECT\s+(?:DISTINCT\s+)?(.+?)\s+FROM',
-            q_clean, re.IGNORECASE | re.DOTALL
-        )
-        existing_cols = select_match.group(1).lower() if select_match else ''
+        select_match = _RE_SELECT_FULL.search(q_clean)
+        existing_cols = select_match.group(2).lower() if select_match else ''
 
         extra_cols = []
         if has_nr_filter and 'nr_umowy' not in existing_cols:
@@ -152,51 +548,35 @@ class QueryCache:
         if has_lok_filter and 'nazwa_sklepu' not in existing_cols:
             extra_cols.append('nazwa_sklepu')
 
-        if extra_cols:
+        if extra_cols and select_match:
+            # SELECT DISTINCT col1 → SELECT DISTINCT nr_umowy, col1
             prefix = ', '.join(extra_cols) + ', '
-            if has_distinct:
-                # SELECT DISTINCT col1 → SELECT DISTINCT nr_umowy, col1
-                q_clean = re.sub(
-                    r'SELECT\s+DISTINCT\s+',
-                    f'SELECT DISTINCT {prefix}',
-                    q_clean,
-                    count=1,
-                    flags=re.IGNORECASE,
-                )
-            else:
-                q_clean = re.sub(
-                    r'SELECT\s+',
-                    f'SELECT {prefix}',
-                    q_clean,
-                    count=1,
-                    flags=re.IGNORECASE,
-                )
+            distinct = 'DISTINCT ' if select_match.group(1) else ''
+            q_clean = (f"{q_clean[:select_match.start()]}SELECT {distinct}"
+                       f"{prefix}{select_match.group(2)}{select_match.group(3)}")
 
         # Ustal indeksy kolumn filtrujących w wyniku zapytania batch
-        nr_col = None
-        lok_col = None
+        # (extra_cols to stałe małymi literami; lista kolumn SELECT – raz)
         added_count = len(extra_cols)
+        orig_cols = None
 
-        if has_nr_filter:
-            if 'nr_umowy' in [c.lower() for c in extra_cols]:
-                nr_col = extra_cols.index('nr_umowy')
-            else:
-                # nr_umowy jest już w oryginalnym SELECT – znajdź pozycję
-                cols = [c.strip().lower() for c in existing_cols.split(',')]
-                nr_col = added_count + cols.index('nr_umowy') if 'nr_umowy' in cols else None
+        def col_index(name: str) -> Optional[int]:
+            nonlocal orig_cols
+            if name in extra_cols:
+                return extra_cols.index(name)
+            # Kolumna jest już w oryginalnym SELECT – znajdź pozycję
+            if orig_cols is None:
+                orig_cols = [c.strip() for c in existing_cols.split(',')]
+            return added_count + orig_cols.index(name) if name in orig_cols else None
 
-        if has_lok_filter:
-            if 'nazwa_sklepu' in [c.lower() for c in extra_cols]:
-                lok_col = extra_cols.index('nazwa_sklepu')
-            else:
-                cols = [c.strip().lower() for c in existing_cols.split(',')]
-                lok_col = added_count + cols.index('nazwa_sklepu') if 'nazwa_sklepu' in cols else None
+        nr_col = col_index('nr_umowy') if has_nr_filter else None
+        lok_col = col_index('nazwa_sklepu') if has_lok_filter else None
 
         return q_clean.strip(), nr_col, lok_col, added_count
 
     def _get_template_query(self, query: str) -> str:
-        """Zwraca query z placeholder'ami {nr}/{lok} — jako klucz cache."""
-        return query.strip()
+        """Zwraca query z placeholder'ami {nr}/{lok} (kanoniczne) — jako klucz cache."""
+        return _canonical_query(query)
 
     def _get_base_query_cached(self, template: str) -> tuple:
         """Cache'owana wersja _make_base_query — regex tylko raz."""
@@ -204,78 +584,369 @@ class QueryCache:
             self._base_query_cache[template] = self._make_base_query(template)
         return self._base_query_cache[template]
 
-    def prefetch(self, queries: List[str]):
+    @staticmethod
+    def _is_per_call(base_q: str) -> bool:
+        """
+        Zapytanie bez wersji batch – placeholder został w zapytaniu (np.
+        CALL PROC({nr})), więc trzeba je wykonać osobno per (nr, lok).
+        """
+        return '{nr}' in base_q or '{lok}' in base_q
+
+    @staticmethod
+    def _call_key(template: str, nr: str = None, lokalizacja: str = None) -> tuple:
+        """Klucz wyniku per wywołanie – lok tylko gdy zapytanie go używa."""
+        return (
+            template,
+            None if nr is None else sys.intern(str(nr)),
+            None if lokalizacja is None or '{lok}' not in template
+            else sys.intern(str(lokalizacja)),
+        )
+
+    @staticmethod
+    def _key_set(values: Optional[Iterable[str]],
+                 value: Optional[str]) -> Optional[frozenset]:
+        """Filtr wielu wartości jako frozenset internowanych stringów (None = bez filtra)."""
+        if values is None:
+            values = None if value is None else (value,)
+        if values is None:
+            return None
+        return frozenset(sys.intern(str(v)) for v in values)
+
+    def _run_calls(self, template: str, keys: List[tuple]) -> int:
+        """Wykonuje wywołania dla paczki kluczy na jednym połączeniu z puli."""
+        total_rows = executed = 0
+        # Jeden kursor na paczkę: ten sam tekst SQL (?) wykonywany kolejno
+        # z innymi parametrami – sterownik nie alokuje kursora per wywołanie
+        try:
+            with self._pool.cursor() as cursor:
+                for key in keys:
+                    _, nr, lok = key
+                    sql, params = _parameterize_query(template, nr=nr, lokalizacja=lok)
+                    if params:
+                        cursor.execute(sql, params)
+                    else:
+                        cursor.execute(sql)
+                    rows = list(_iter_rows(cursor))
+                    # Do LRU od razu – przy budżecie mniejszym niż komplet
+                    # wyników najstarsze wypadają już w trakcie prefetchu
+                    self._store(key, rows)
+                    total_rows += len(rows)
+                    executed += 1
+        finally:
+            with self._lock:
+                self._query_count += executed
+        return total_rows
+
+    def _prefetch_calls(self, template: str, keys) -> None:
+        """
+        Wykonuje zapytanie per-wywołanie RAZ dla każdego (nr, lok) z keys,
+        przed pętlą raportów. Przy puli > 1 klucze dzielone są między
+        połączenia i wykonywane w wątkach – czasy odpowiedzi HANA nakładają
+        się zamiast sumować.
+        """
+        todo = {}
+        for nr, lok in keys:
+            key = self._call_key(template, nr, lok)
+            if key not in self._cache:
+                todo[key] = None
+        if not todo:
+            return
+        todo = list(todo)
+        log.info(f"    📦 Batch CALL: {template[:120]} × {len(todo)}")
+        workers = min(self._pool.size, len(todo))
+        try:
+            if workers > 1:
+                parts = [todo[i::workers] for i in range(workers)]
+                with ThreadPoolExecutor(max_workers=workers) as executor:
+                    total_rows = sum(executor.map(
+                        lambda part: self._run_calls(template, part), parts
+                    ))
+            else:
+                total_rows = self._run_calls(template, todo)
+            log.info(f"       → {total_rows} wierszy")
+        except Exception as e:
+            # Brakujące klucze pobierze get() pojedynczo
+            log.warning(f"    ✗ Batch error: {e}")
+
+    def prefetch(self, queries: List[str], call_keys: Dict[str, set] = None,
+                 contract_ids: List[str] = None):
         """
         Pobiera dane dla wszystkich unikalnych zapytań naraz.
         Wywoływane RAZ przed generowaniem raportów.
+
+        Zapytania bez wersji batch (CALL PROC({nr})) wykonywane są raz per
+        (nr, lok) z call_keys {szablon: {(nr, lok), ...}} – bez powtórzeń
+        między typami raportów korzystającymi z tej samej procedury.
+
+        contract_ids – gdy podane (najwyżej IN_LIST_MAX), zapytania z filtrem
+        nr_umowy pobierają tylko wiersze tych umów (IN (...) po stronie HANA)
+        zamiast całej tabeli; dla innych umów cache jest wtedy pusty.
         """
+        call_keys = call_keys or {}
+        if contract_ids is not None:
+            contract_ids = list(dict.fromkeys(str(nr) for nr in contract_ids))
+            if len(contract_ids) > IN_LIST_MAX:
+                contract_ids = None
         seen = set()
-        for query_template in queries:
+        batch = []      # szablony z wersją batch (bez filtrów nr/lok)
+        # Powtórzenia tego samego tekstu (wspólne tabele typów raportów)
+        # odpadają przed kanonizacją; pozostałe – po szablonie, przed regexami
+        for query_template in dict.fromkeys(queries):
             template = self._get_template_query(query_template)
             if template in seen or template in self._cache:
                 continue
             seen.add(template)
 
-            base_q, nr_col, lok_col, added = self._get_base_query_cached(template)
+            base_q, _, _, _ = self._get_base_query_cached(template)
+            if self._is_per_call(base_q):
+                self._prefetch_calls(template, call_keys.get(template, ()))
+                continue
+            batch.append(template)
+
+        plan = self._plan_batch(batch)
+        workers = min(self._pool.size, len(plan))
+        if workers > 1:
+            # Zapytania batch równolegle na połączeniach puli – czasy
+            # odpowiedzi HANA nakładają się zamiast sumować
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                results = list(executor.map(
+                    lambda entry: self._run_batch(entry, contract_ids), plan
+                ))
+        else:
+            results = [self._run_batch(entry, contract_ids) for entry in plan]
 
-            cursor = self._conn.cursor()
-            try:
-                print(f"    📦 Batch: {base_q[:120]}...")
-                cursor.execute(base_q)
-                rows = cursor.fetchall()
-                self._cache[template] = [
-                    [str(cell) if cell is not None else '' for cell in row]
-                    for row in rows
-                ]
+        for (_, _, _, members), rows in zip(plan, results):
+            if rows is None:
+                rows = []
+            else:
                 self._query_count += 1
-                print(f"       → {len(rows)} wierszy")
-            except Exception as e:
-                print(f"    ✗ Batch error: {e}")
-                self._cache[template] = []
-            finally:
-                cursor.close()
+            for template, projection in members:
+                if projection is None:
+                    self._store(template, rows)
+                else:
+                    self._store(template, [[row[i] for i in projection] for row in rows])
+
+    def _run_batch(self, entry: tuple, contract_ids: List[str] = None) -> Optional[List[list]]:
+        """Wykonuje jedno zapytanie z planu batch; None przy błędzie."""
+        sql, by_nr, key_cols, members = entry
+        params = None
+        if contract_ids and by_nr:
+            # Zapytanie opakowane – WHERE na końcu nie koliduje z ORDER/GROUP BY
+            placeholders = ', '.join(['?'] * len(contract_ids))
+            sql = (f"SELECT * FROM ({sql}) AS b "
+                   f"WHERE b.nr_umowy IN ({placeholders})")
+            params = contract_ids
+
+        try:
+            fused = f" ({len(members)} zapytań)" if len(members) > 1 else ''
+            log.info(f"    📦 Batch{fused}: {sql[:120]}...")
+            with self._pool.connection() as conn:
+                rows = []
+                for row in stream_query(conn, sql, params, batch=FETCH_BATCH_LARGE):
+                    # Kolumny kluczy (nr, lok) powtarzają się w tysiącach
+                    # wierszy – jeden obiekt str na wartość zamiast kopii
+                    for i in key_cols:
+                        row[i] = sys.intern(row[i])
+                    rows.append(row)
+            log.info(f"       → {len(rows)} wierszy")
+            return rows
+        except Exception as e:
+            log.warning(f"    ✗ Batch error: {e}")
+            return None
+
+    @staticmethod
+    def _split_select(base_q: str) -> Optional[Tuple[List[str], str]]:
+        """
+        (kolumny, reszta od FROM) prostego SELECT – None, gdy zapytania nie
+        da się scalić (DISTINCT, wyrażenia / * w liście kolumn).
+        """
+        m = _RE_SELECT_FULL.match(base_q)
+        if m is None or m.group(1):
+            return None
+        cols = [c.strip() for c in m.group(2).split(',')]
+        if not all(_RE_SIMPLE_COL.match(c) for c in cols):
+            return None
+        return cols, m.group(3)
+
+    def _plan_batch(self, templates: List[str]) -> List[tuple]:
+        """
+        Plan zapytań batch: szablony z identycznym FROM/WHERE (po usunięciu
+        filtrów umowy) scalane w jeden SELECT z sumą kolumn – jedno
+        przejście po tabeli w HANA, kolumny każdego szablonu wycinane
+        z wyniku (projekcja). DISTINCT i wyrażenia – bez scalania.
+
+        Zwraca [(sql, filtr_nr, kolumny_kluczy, [(szablon, projekcja|None)])].
+        """
+        plan = []
+        groups: Dict[tuple, List[tuple]] = {}
+        for template in templates:
+            base_q, nr_col, lok_col, _ = self._get_base_query_cached(template)
+            key_cols = [c for c in (nr_col, lok_col) if c is not None]
+            parts = self._split_select(base_q)
+            if parts is None:
+                plan.append((base_q, nr_col is not None, key_cols, [(template, None)]))
+                continue
+            cols, tail = parts
+            groups.setdefault((tail, nr_col is not None), []).append(
+                (template, cols, base_q, key_cols))
+
+        for (tail, by_nr), members in groups.items():
+            if len(members) == 1:
+                template, _, base_q, key_cols = members[0]
+                plan.append((base_q, by_nr, key_cols, [(template, None)]))
+                continue
+            union: Dict[str, str] = {}
+            for _, cols, _, _ in members:
+                for col in cols:
+                    union.setdefault(col.lower(), col)
+            position = {name: i for i, name in enumerate(union)}
+            fused_members = []
+            fused_keys = set()
+            for template, cols, _, key_cols in members:
+                projection = [position[col.lower()] for col in cols]
+                fused_members.append((template, projection))
+                fused_keys.update(projection[i] for i in key_cols)
+            sql = f"SELECT {', '.join(union.values())}{tail}"
+            plan.append((sql, by_nr, sorted(fused_keys), fused_members))
+        return plan
 
     def get(self, query_template: str, nr: str = None,
-            lokalizacja: str = None) -> List[List[str]]:
+            lokalizacja: str = None, nrs: Iterable[str] = None,
+            lokalizacje: Iterable[str] = None) -> List[List[str]]:
         """
         Zwraca przefiltrowane wyniki z cache.
         Jeśli nie ma w cache, wykonuje zapytanie tradycyjnie (fallback).
+
+        nrs / lokalizacje – filtr po wielu wartościach naraz (IN); dowolny
+        iterable, wewnętrznie zamieniany na frozenset (lookup O(1) na wiersz).
         """
+        if nrs is not None or lokalizacje is not None:
+            return self._get_many(query_template, nr, lokalizacja, nrs, lokalizacje)
+        # Normalizacja kluczy raz na wejściu – internowane jak klucze w buckets
+        # (porównanie w słowniku kończy się na identyczności wskaźnika)
+        if nr is not None:
+            nr = sys.intern(str(nr))
+        if lokalizacja is not None:
+            lokalizacja = sys.intern(str(lokalizacja))
         template = self._get_template_query(query_template)
-        _, nr_col, lok_col, added_count = self._get_base_query_cached(template)
+        base_q, nr_col, lok_col, added_count = self._get_base_query_cached(template)
+
+        if self._is_per_call(base_q):
+            key = self._call_key(template, nr, lokalizacja)
+            rows = self._cache.get(key)
+            if rows is not None:
+                self._cache.move_to_end(key)
+                self._batch_hits += 1
+                return rows
+            self._batch_misses += 1
+            resolved, params = _parameterize_query(
+                query_template, nr=nr, lokalizacja=lokalizacja
+            )
+            with self._pool.connection() as conn:
+                rows = list(stream_query(conn, resolved, params))
+            self._query_count += 1
+            self._store(key, rows)
+            return rows
 
-        if template not in self._cache:
+        if not self._touch(template):
             # Fallback – zapytanie z parametrami wiązanymi (bezpieczne)
             resolved, params = _parameterize_query(
                 query_template, nr=nr, lokalizacja=lokalizacja
             )
-            cursor = self._conn.cursor()
-            try:
-                cursor.execute(resolved, params)
-                rows = cursor.fetchall()
-                self._query_count += 1
-                return [
-                    [str(c) if c is not None else '' for c in row]
-                    for row in rows
-                ]
-            finally:
-                cursor.close()
-
-        all_rows = self._cache[template]
-
-        # Filtruj po nr_umowy
-        if nr is not None and nr_col is not None:
-            all_rows = [r for r in all_rows if r[nr_col] == str(nr)]
-
-        # Filtruj po lokalizacja
-        if lokalizacja is not None and lok_col is not None:
-            all_rows = [r for r in all_rows if r[lok_col] == str(lokalizacja)]
+            with self._pool.connection() as conn:
+                rows = list(stream_query(conn, resolved, params))
+            self._query_count += 1
+            return rows
+
+        by_nr = nr is not None and nr_col is not None
+        by_lok = lokalizacja is not None and lok_col is not None
+        key = (nr if by_nr else None, lokalizacja if by_lok else None)
+        if not added_count:
+            return self._get_buckets(template, by_nr, by_lok).get(key, [])
+        # Późna materializacja: wiersze bez extra_cols tylko dla zwracanej
+        # grupy (raz), nie dla całego wyniku przy grupowaniu
+        vkey = (by_nr, by_lok, key)
+        views = self._views.setdefault(template, {})
+        rows = views.get(vkey)
+        if rows is None:
+            group = self._get_buckets(template, by_nr, by_lok).get(key)
+            if not group:
+                return []
+            rows = views[vkey] = [row[added_count:] for row in group]
+            self._charge(template, _estimate_view_bytes(rows))
+        return rows
+
+    def _get_many(self, query_template: str, nr: Optional[str],
+                  lokalizacja: Optional[str], nrs: Optional[Iterable[str]],
+                  lokalizacje: Optional[Iterable[str]]) -> List[List[str]]:
+        """get() z filtrem po zbiorach wartości – jedno przejście po wierszach."""
+        # Internowane jak wartości kolumn klucza – trafienie w zbiorze kończy
+        # się na porównaniu wskaźników
+        nrs_set = self._key_set(nrs, nr)
+        lok_set = self._key_set(lokalizacje, lokalizacja)
 
-        # Usuń tylko kolumny które DODALIŚMY na początek (extra_cols)
-        if added_count > 0:
-            return [row[added_count:] for row in all_rows]
+        template = self._get_template_query(query_template)
+        base_q, nr_col, lok_col, added_count = self._get_base_query_cached(template)
+        if self._is_per_call(base_q) or not self._touch(template):
+            # Brak wyników batch – osobne get() dla każdej kombinacji kluczy
+            return [
+                row
+                for n in (sorted(nrs_set) if nrs_set is not None else (None,))
+                for l in (sorted(lok_set) if lok_set is not None else (None,))
+                for row in self.get(query_template, nr=n, lokalizacja=l)
+            ]
+
+        if nr_col is None:
+            nrs_set = None
+        if lok_col is None:
+            lok_set = None
+        return [
+            row[added_count:] if added_count else row
+            for row in self._cache[template]
+            if (nrs_set is None or row[nr_col] in nrs_set)
+            and (lok_set is None or row[lok_col] in lok_set)
+        ]
 
-        return all_rows
+    def _get_buckets(self, template: str, by_nr: bool,
+                     by_lok: bool) -> Dict[tuple, List[list]]:
+        """
+        Wyniki batch pogrupowane po (nr, lok) – jedno przejście po wierszach
+        na szablon, potem get() to lookup w słowniku zamiast skanu całości
+        per umowa.
+        """
+        bkey = (by_nr, by_lok)
+        per_template = self._buckets.setdefault(template, {})
+        buckets = per_template.get(bkey)
+        if buckets is not None:
+            return buckets
+        _, nr_col, lok_col, _ = self._get_base_query_cached(template)
+        rows = self._cache[template]
+        # Grupy trzymają oryginalne wiersze – kolumny dodane (extra_cols)
+        # usuwa get() dopiero dla zwracanej grupy
+        if not (by_nr or by_lok):
+            buckets = {(None, None): rows}
+        else:
+            # Kolumna(y) klucza wyciągnięte jednym przejściem w C (itemgetter),
+            # pętla Pythona tylko rozkłada wiersze do grup
+            if by_nr and by_lok:
+                keys = map(itemgetter(nr_col, lok_col), rows)
+            else:
+                keys = map(itemgetter(nr_col if by_nr else lok_col), rows)
+            groups: Dict[Any, List[list]] = {}
+            setdefault = groups.setdefault
+            for key, row in zip(keys, rows):
+                setdefault(key, []).append(row)
+            if by_nr and by_lok:
+                buckets = groups
+            elif by_nr:
+                buckets = {(key, None): group for key, group in groups.items()}
+            else:
+                buckets = {(None, key): group for key, group in groups.items()}
+        per_template[bkey] = buckets
+        # Grupy to nowe listy referencji do wierszy (wartości już policzone)
+        self._charge(template, sys.getsizeof(buckets)
+                     + sum(map(sys.getsizeof, buckets.values())))
+        return buckets
 
 
 class ReportFactory:
@@ -284,63 +955,201 @@ class ReportFactory:
     Konfiguracja z plików YAML, dane z SAP HANA (SELECT).
     
     Optymalizacje:
-      - Jedno połączenie na cały cykl generowania
+      - Pula połączeń otwarta raz na cały cykl generowania
       - Batch prefetch – 1 zapytanie zamiast N
       - Cache wyników
     """
 
-    def __init__(self, config_dir: str = "config", connection=None):
+    def __init__(self, config_dir: str = "config", connection=None,
+                 pool_size: int = 1):
+        """
+        Args:
+            config_dir: Folder z konfiguracjami YAML
+            connection: Gotowe połączenie (nie zamykane przez factory)
+            pool_size: Liczba sesji HANA w puli (gdy nie podano connection)
+        """
         self.config_dir = Path(config_dir)
         self.configs: Dict[ReportType, dict] = {}
-        self._connection = connection  # jedno połączenie na cały run
-        self._owns_connection = connection is None
+        self._connection = connection
+        self._pool_size = pool_size
+        self._pool: Optional[HanaPool] = None
         self._cache: Optional[QueryCache] = None
+        # (szablon, nr, lok) → wiersze – tylko bez batch cache (ten sam klucz
+        # trzyma wtedy QueryCache); wspólne dla typów raportów z tymi samymi
+        # zapytaniami (wyniki współdzielone, nie modyfikować)
+        self._results: "OrderedDict[tuple, List[List[str]]]" = OrderedDict()
+        self._result_hits = 0
+        self._result_misses = 0
+        self._locations: Dict[str, List[str]] = {}  # nr_umowy → posortowane sklepy
+        # Typ raportu → stałe części opisów tabel (bez 'data'), liczone raz
+        self._table_layouts: Dict[ReportType, Tuple[dict, ...]] = {}
+        # Zapytania tabel z nazwa_sklepu (źródło lokalizacji w trybie batch)
+        self._shop_queries: Tuple[str, ...] = ()
         self._load_all_configs()
 
-    def _get_connection(self):
-        """Zwraca połączenie – tworzy jeśli nie przekazano."""
-        if self._connection is None:
-            self._connection = get_hana_connection()
-            self._owns_connection = True
-        return self._connection
+    def _get_pool(self) -> HanaPool:
+        """Zwraca pulę połączeń – otwiera ją przy pierwszym zapytaniu."""
+        if self._pool is None:
+            if self._connection is not None:
+                self._pool = HanaPool(connections=[self._connection])
+            else:
+                self._pool = HanaPool(self._pool_size)
+        return self._pool
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
 
     def close(self):
-        """Zamyka połączenie jeśli factory je utworzyło."""
-        if self._owns_connection and self._connection is not None:
-            self._connection.close()
-            self._connection = None
+        """Zamyka pulę (połączenia przekazane z zewnątrz zostają otwarte)."""
+        if self._pool is not None:
+            self._pool.close()
+            self._pool = None
+        self._results.clear()
+
+    def invalidate_cache(self):
+        """
+        Porzuca zapamiętane wyniki i dane batch – kolejne raporty pytają
+        bazę od nowa (po prepare_batch znów z batch cache).
+        """
+        self._results.clear()
+        self._locations.clear()
+        self._cache = None
+
+    def _recall(self, key: tuple) -> Optional[List[List[str]]]:
+        """
+        Wynik z cache LRU (None gdy brak) – trafienie odświeża wpis.
+        Zwracana jest ta sama lista co przy zapisie (bez kopii) – wywołujący
+        nie może jej modyfikować.
+        """
+        rows = self._results.get(key)
+        if rows is not None:
+            self._results.move_to_end(key)
+            self._result_hits += 1
+        return rows
+
+    def _remember(self, key: tuple, rows: List[List[str]]) -> List[List[str]]:
+        """Zapamiętuje wynik; najstarsze wpisy ponad RESULT_CACHE_MAX wypadają."""
+        self._result_misses += 1
+        self._results[key] = rows
+        self._results.move_to_end(key)
+        while len(self._results) > RESULT_CACHE_MAX:
+            self._results.popitem(last=False)
+        return rows
+
+    def cache_stats(self) -> str:
+        """Trafienia cache wyników zapytań – do logu na koniec budowania."""
+        batch = self._cache.cache_stats() if self._cache is not None else ''
+        total = self._result_hits + self._result_misses
+        if batch and not total:
+            return batch
+        rate = 100.0 * self._result_hits / total if total else 0.0
+        stats = (f"{self._result_hits}/{total} trafień ({rate:.0f}%), "
+                 f"{len(self._results)} unikalnych wyników")
+        return f"{stats}; {batch}" if batch else stats
 
     def _load_all_configs(self):
-        """Ładuje wszystkie konfiguracje YAML."""
-        print(f"\n📂 Konfiguracje: {self.config_dir.resolve()}")
+        """
+        Ładuje wszystkie konfiguracje YAML: z cache procesu, potem z cache
+        pickle, a dopiero przy zmianie pliku – parsowanie YAML.
+        """
+        log.info(f"\n📂 Konfiguracje: {self.config_dir.resolve()}")
+        sig = _config_signature(self.config_dir)
+        cached = None           # configs z pickle – czytane dopiero przy pudle w pamięci
+        stale = False
+        parsed = {}
         for report_type in ReportType:
             config_path = self.config_dir / f"{report_type.value}.yaml"
-            if not config_path.exists():
-                print(f"  ⚠️  Brak: {config_path.name}")
+            file_sig = sig.get(config_path.name)
+            if file_sig is None:
+                log.warning(f"  ⚠️  Brak: {config_path.name}")
                 continue
-            with open(config_path, 'r', encoding='utf-8') as f:
-                self.configs[report_type] = yaml.safe_load(f)
+            cfg = _yaml_cache_get(config_path, file_sig)
+            if cfg is None:
+                if cached is None:
+                    cached = _read_config_cache(self.config_dir, sig)
+                    stale = cached is None
+                    cached = cached or {}
+                cfg = cached.get(config_path.name)
+            if cfg is None:
+                cfg = _parse_yaml(config_path)
+            _yaml_cache_put(config_path, file_sig, cfg)
+            parsed[config_path.name] = cfg
+            self.configs[report_type] = cfg
+            self._table_layouts[report_type] = self._compile_table_layouts(cfg)
             tables = len(self.configs[report_type].get('data_tables', []))
-            print(f"  ✓ {report_type.value} ({tables} tabel)")
+            log.info(f"  ✓ {report_type.value} ({tables} tabel)")
+        if stale and parsed:
+            _write_config_cache(self.config_dir, sig, parsed)
+
+        # Raz przy ładowaniu – nie przy każdym wyszukiwaniu lokalizacji
+        self._shop_queries = tuple(
+            q
+            for cfg in self.configs.values()
+            for table_cfg in cfg.get('data_tables', [])
+            for q in (table_cfg.get('query', ''),)
+            if 'nazwa_sklepu' in q.lower()
+        )
+
+    @staticmethod
+    def _compile_table_layouts(cfg: dict) -> Tuple[dict, ...]:
+        """
+        Opisy tabel dla generate_pdf bez danych – formatowanie z YAML
+        rozwinięte RAZ przy ładowaniu, nie przy każdym raporcie.
+        """
+        layouts = []
+        for table_cfg in cfg.get('data_tables', []):
+            fmt = table_cfg.get('formatting', {})
+            layouts.append({
+                'title': table_cfg['title'],
+                'subtitle': table_cfg.get('subtitle', ''),
+                'headers': table_cfg['headers'],
+                'currency_columns': fmt.get('currency_columns', []),
+                'currency_columns_2': fmt.get('currency_columns_2', []),
+                'percentage_columns': fmt.get('percentage_columns', []),
+                'add_total_row': fmt.get('add_total_row', True),
+                'column_widths': fmt.get('column_widths'),
+            })
+        return tuple(layouts)
 
     # ------------------------------------------------------------------
     #  BATCH PREFETCH
     # ------------------------------------------------------------------
 
-    def prepare_batch(self, report_types: List[ReportType] = None):
+    def prepare_batch(self, report_types: List[ReportType] = None,
+                      tasks: List[tuple] = None,
+                      contract_ids: List[str] = None):
         """
         Prefetch: pobiera WSZYSTKIE dane za jednym razem.
         Wywołaj RAZ przed pętlą po umowach.
 
         Zamiast 1000 umów × 5 tabel = 5000 zapytań
         → max ~5 zapytań (1 per unikalną tabelę).
+
+        Args:
+            report_types: Typy raportów do przygotowania (None = wszystkie)
+            tasks: Lista (report_type, nr, lokalizacja) planowanych raportów –
+                   procedury CALL bez wersji batch wykonywane są dla nich
+                   z góry (raz per unikalne wywołanie)
+            contract_ids: Umowy, których dane będą potrzebne – zapytania batch
+                          filtrowane wtedy w HANA (None = wszystkie wiersze)
         """
-        conn = self._get_connection()
-        self._cache = QueryCache(conn)
+        self._cache = QueryCache(self._get_pool())
 
         types = report_types or list(self.configs.keys())
         all_queries = []
 
+        # Szablon zapytania → zbiór (nr, lok), dla których będzie potrzebny
+        call_keys: Dict[str, set] = {}
+        for rt, nr, lok in tasks or ():
+            cfg = self.configs.get(rt)
+            if cfg is None:
+                continue
+            for q in [cfg['summary']['query']] + [t['query'] for t in cfg['data_tables']]:
+                call_keys.setdefault(self._cache._get_template_query(q), set()).add((nr, lok))
+
         for rt in types:
             if rt not in self.configs:
                 continue
@@ -351,9 +1160,9 @@ class ReportFactory:
             for table_cfg in cfg['data_tables']:
                 all_queries.append(table_cfg['query'])
 
-        print(f"\n🚀 BATCH PREFETCH: {len(all_queries)} zapytań do pobrania")
-        self._cache.prefetch(all_queries)
-        print(f"   ✓ Wykonano {self._cache.query_count} unikalnych zapytań SQL")
+        log.info(f"\n🚀 BATCH PREFETCH: {len(all_queries)} zapytań do pobrania")
+        self._cache.prefetch(all_queries, call_keys, contract_ids)
+        log.info(f"   ✓ Wykonano {self._cache.query_count} unikalnych zapytań SQL")
 
     # ------------------------------------------------------------------
     #  POBIERANIE DANYCH Z HANA (z cache lub direct)
@@ -361,45 +1170,75 @@ class ReportFactory:
 
     def _execute_query(self, query: str, nr: str, lokalizacja: str = None) -> List[List[str]]:
         """
-        Pobiera dane – z cache (jeśli batch) lub bezpośrednio.
+        Pobiera dane – z cache (jeśli batch) lub bezpośrednio. Bez batch
+        wynik zapamiętywany per (szablon, nr, lok): kolejne typy raportów
+        z tym samym zapytaniem nie odpytują bazy ponownie. Z batch wyniki
+        deduplikuje już QueryCache.
+
+        Wynik jest współdzielony (bez kopii) – nie modyfikować.
         """
         if self._cache is not None:
             return self._cache.get(query, nr=nr, lokalizacja=lokalizacja)
-
-        # Fallback – bezpośrednie zapytanie z parametrami wiązanymi
-        conn = self._get_connection()
-        cursor = conn.cursor()
-        try:
-            resolved_query, params = _parameterize_query(
-                query, nr=nr, lokalizacja=lokalizacja
-            )
-            print(f"    SQL: {resolved_query}  params={params}")
+        key = QueryCache._call_key(_canonical_query(query), nr, lokalizacja)
+        rows = self._recall(key)
+        if rows is not None:
+            return rows
+        return self._remember(key, self._run_query(query, nr, lokalizacja))
+
+    def _run_query(self, query: str, nr: str, lokalizacja: str = None) -> List[List[str]]:
+        """Wykonuje zapytanie bezpośrednio z HANA (parametry wiązane)."""
+        resolved_query, params = _parameterize_query(
+            query, nr=nr, lokalizacja=lokalizacja
+        )
+        log.debug("    SQL: %s  params=%s", resolved_query, params)
+        with self._get_pool().cursor() as cursor:
             cursor.execute(resolved_query, params)
             try:
-                rows = cursor.fetchall()
-                return [
-                    [str(cell) if cell is not None else '' for cell in row]
-                    for row in rows
-                ]
+                return list(_iter_rows(cursor))
             except Exception:
                 return []
-        finally:
-            cursor.close()
+
+    def _execute_query_one(self, query: str, nr: str,
+                           lokalizacja: str = None) -> Optional[List[str]]:
+        """
+        Pierwszy wiersz wyniku (None gdy pusty). Bez batch cache pobiera
+        tylko fetchone() – reszta wyniku nie jest zamieniana na stringi.
+        """
+        if self._cache is not None:
+            rows = self._execute_query(query, nr, lokalizacja)
+            return rows[0] if rows else None
+
+        key = QueryCache._call_key(_canonical_query(query), nr, lokalizacja) + ('first',)
+        rows = self._recall(key)
+        if rows is not None:
+            return rows[0] if rows else None
+
+        resolved_query, params = _parameterize_query(
+            query, nr=nr, lokalizacja=lokalizacja
+        )
+        log.debug("    SQL: %s  params=%s", resolved_query, params)
+        with self._get_pool().cursor() as cursor:
+            cursor.execute(resolved_query, params)
+            try:
+                row = cursor.fetchone()
+            except Exception:
+                row = None
+        rows = self._remember(key, [_stringify_row(row)] if row else [])
+        return rows[0] if rows else None
 
     def _fetch_summary(self, config: dict, nr: str) -> List[List[str]]:
         """Pobiera dane podsumowania (pary etykieta/wartość)."""
         query = config['summary']['query']
         labels = config['summary']['labels']
-        rows = self._execute_query(query, nr)
+        values = self._execute_query_one(query, nr)
 
-        if not rows:
+        if values is None:
             return [[label, ''] for label in labels]
 
         # Walidacja: liczba kolumn vs etykiet
-        values = rows[0]
         if len(values) != len(labels):
-            print(f"  ⚠️  Summary: oczekiwano {len(labels)} kolumn, "
-                  f"otrzymano {len(values)} – dane mogą być niepoprawne")
+            log.warning(f"  ⚠️  Summary: oczekiwano {len(labels)} kolumn, "
+                        f"otrzymano {len(values)} – dane mogą być niepoprawne")
 
         # Pierwszy wiersz wyników → mapuj na etykiety
         return [
@@ -407,10 +1246,34 @@ class ReportFactory:
             for i, label in enumerate(labels)
         ]
 
-    def _fetch_table_data(self, table_cfg: dict, nr: str,
-                          lokalizacja: str = None) -> List[List[str]]:
-        """Pobiera dane dla pojedynczej tabeli."""
-        return self._execute_query(table_cfg['query'], nr, lokalizacja)
+    def _fetch_all_for_nr(self, config: dict, nr: str,
+                          lokalizacja: str = None) -> List[List[List[str]]]:
+        """
+        Dane wszystkich tabel raportu (w kolejności z konfiguracji).
+
+        Bez batch cache (prepare_batch) brakujące wyniki pobierane są
+        równolegle na połączeniach puli – K zapytań kosztuje ~K/N czasów
+        odpowiedzi HANA zamiast K. Z batch cache wszystko jest już w pamięci.
+        """
+        queries = [_canonical_query(t['query']) for t in config['data_tables']]
+        fetched = {}
+        if self._cache is None:
+            missing = list(dict.fromkeys(
+                q for q in queries
+                if QueryCache._call_key(q, nr, lokalizacja) not in self._results
+            ))
+            workers = min(self._get_pool().size, len(missing))
+            if workers > 1:
+                with ThreadPoolExecutor(max_workers=workers) as executor:
+                    fetched = dict(zip(missing, executor.map(
+                        lambda q: self._run_query(q, nr, lokalizacja), missing
+                    )))
+                for q, rows in fetched.items():
+                    self._remember(QueryCache._call_key(q, nr, lokalizacja), rows)
+        return [
+            fetched[q] if q in fetched else self._execute_query(q, nr, lokalizacja)
+            for q in queries
+        ]
 
     # ------------------------------------------------------------------
     #  POBIERANIE LISTY UMÓW / KLIENTÓW
@@ -424,30 +1287,31 @@ class ReportFactory:
         
         DOSTOSUJ zapytanie do swojej tabeli!
         """
-        conn = self._get_connection()
-        cursor = conn.cursor()
-        try:
+        with self._get_pool().cursor() as cursor:
             # ZMIEŃ nazwę tabeli na swoją:
             query = """
                 SELECT DISTINCT nr_umowy, klient, podtyp_klient, id, pla
                 FROM your_contracts_table
                 ORDER BY nr_umowy
             """
+            _tune_cursor(cursor, FETCH_BATCH_LARGE)
             cursor.execute(query)
-            rows = cursor.fetchall()
             contracts = []
-            for row in rows:
-                if row and len(row) >= 5:
-                    contracts.append({
-                        'nr_umowy': str(row[0]),
-                        'klient': str(row[1]),
-                        'podtyp_klient': str(row[2]),
-                        'id': str(row[3]),
-                        'pla': str(row[4]),
-                    })
+            # Paczkami (fetchmany) – bez pełnej surowej kopii wyniku w pamięci
+            while True:
+                rows = cursor.fetchmany(FETCH_BATCH_LARGE)
+                if not rows:
+                    break
+                for row in rows:
+                    if row and len(row) >= 5:
+                        contracts.append({
+                            'nr_umowy': str(row[0]),
+                            'klient': str(row[1]),
+                            'podtyp_klient': str(row[2]),
+                            'id': str(row[3]),
+                            'pla': str(row[4]),
+                        })
             return contracts
-        finally:
-            cursor.close()
 
     def get_locations_for_contract(self, nr_umowy: str) -> List[str]:
         """
@@ -457,22 +1321,25 @@ class ReportFactory:
         
         DOSTOSUJ zapytanie do swojej tabeli!
         """
+        nr_umowy = str(nr_umowy)
+        shops = self._locations.get(nr_umowy)
+        if shops is None:
+            shops = self._locations[nr_umowy] = self._query_locations(nr_umowy)
+        return shops
+
+    def _query_locations(self, nr_umowy: str) -> List[str]:
+        """Lokalizacje jednej umowy – z batch cache albo zapytaniem do HANA."""
         # Próbuj z cache (batch) – szukaj zapytania sklepowego
         if self._cache is not None:
-            for rt, cfg in self.configs.items():
-                for table_cfg in cfg.get('data_tables', []):
-                    q = table_cfg.get('query', '')
-                    if 'nazwa_sklepu' in q.lower():
-                        rows = self._cache.get(q, nr=nr_umowy)
-                        # Kolumna 0 = nazwa_sklepu (pierwsza w SELECT)
-                        shops = sorted(set(r[0] for r in rows if r))
-                        if shops:
-                            return shops
+            for q in self._shop_queries:
+                rows = self._cache.get(q, nr=nr_umowy)
+                # Kolumna 0 = nazwa_sklepu (pierwsza w SELECT)
+                shops = sorted(set(r[0] for r in rows if r))
+                if shops:
+                    return shops
 
         # Fallback – bezpośrednie zapytanie z parametrem wiązanym
-        conn = self._get_connection()
-        cursor = conn.cursor()
-        try:
+        with self._get_pool().cursor() as cursor:
             query = """
                 SELECT DISTINCT nazwa_sklepu 
                 FROM your_shops_table
@@ -481,9 +1348,41 @@ class ReportFactory:
             """
             cursor.execute(query, [str(nr_umowy)])
             rows = cursor.fetchall()
-            return [str(row[0]) for row in rows if row]
-        finally:
-            cursor.close()
+            # Kolejność z ORDER BY; dict.fromkeys usuwa duplikaty po str()
+            return list(dict.fromkeys(str(row[0]) for row in rows if row))
+
+    IN_CHUNK = IN_LIST_MAX
+
+    def get_locations_for_contracts(self, nrs: List[str]) -> Dict[str, List[str]]:
+        """
+        Lokalizacje (sklepy) dla WIELU umów naraz: {nr_umowy: [sklepy]}.
+        Zamiast N zapytań per umowa → jedno zapytanie IN (...) na paczkę
+        IN_CHUNK numerów. W trybie batch korzysta z cache (bez SQL).
+
+        DOSTOSUJ zapytanie do swojej tabeli!
+        """
+        nrs = list(dict.fromkeys(str(nr) for nr in nrs))
+        if self._cache is not None:
+            return {nr: self.get_locations_for_contract(nr) for nr in nrs}
+
+        # Umowy już znane (wcześniejsze wywołania) – bez ponownego SQL
+        todo = [nr for nr in nrs if nr not in self._locations]
+        shops: Dict[str, set] = {nr: set() for nr in todo}
+        with self._get_pool().connection() as conn:
+            for start in range(0, len(todo), self.IN_CHUNK):
+                chunk = todo[start:start + self.IN_CHUNK]
+                placeholders = ', '.join(['?'] * len(chunk))
+                query = f"""
+                    SELECT DISTINCT nr_umowy, nazwa_sklepu
+                    FROM your_shops_table
+                    WHERE nr_umowy IN ({placeholders})
+                """
+                for row in stream_query(conn, query, chunk):
+                    if len(row) >= 2 and row[1] and row[0] in shops:
+                        shops[row[0]].add(row[1])
+        for nr, found in shops.items():
+            self._locations[nr] = sorted(found)
+        return {nr: self._locations[nr] for nr in nrs}
 
     # ------------------------------------------------------------------
     #  GENEROWANIE RAPORTÓW
@@ -507,34 +1406,25 @@ class ReportFactory:
             raise ValueError(f"Brak konfiguracji: {report_type.value}")
 
         config = self.configs[report_type]
-        print(f"\n→ {config['report_type']} | NR={nr}")
+        log.debug("\n→ %s | NR=%s", config['report_type'], nr)
 
-        with Timer("  Podsumowanie"):
+        with Timer("  Podsumowanie", level=logging.DEBUG):
             summary_data = self._fetch_summary(config, nr)
 
         client_name = summary_data[0][1] if summary_data and len(summary_data[0]) > 1 else str(nr)
 
-        tables = []
-        for table_cfg in config['data_tables']:
-            with Timer(f"  {table_cfg['title']}"):
-                data = self._fetch_table_data(table_cfg, nr, lokalizacja)
-                fmt = table_cfg.get('formatting', {})
-                tables.append({
-                    'title': table_cfg['title'],
-                    'subtitle': table_cfg.get('subtitle', ''),
-                    'headers': table_cfg['headers'],
-                    'data': data,
-                    'currency_columns': fmt.get('currency_columns', []),
-                    'currency_columns_2': fmt.get('currency_columns_2', []),
-                    'percentage_columns': fmt.get('percentage_columns', []),
-                    'add_total_row': fmt.get('add_total_row', True),
-                    'column_widths': fmt.get('column_widths'),
-                })
+        with Timer(f"  Tabele ({len(config['data_tables'])})", level=logging.DEBUG):
+            all_data = self._fetch_all_for_nr(config, nr, lokalizacja)
+
+        tables = [
+            {**layout, 'data': data}
+            for layout, data in zip(self._table_layouts[report_type], all_data)
+        ]
 
         # --- Nazwa pliku PDF ---
         year, quarter = self._get_year_quarter()
-        safe_pla = str(pla).replace('/', '_').replace('\\', '_') if pla else 'BRAK_PLA'
-        safe_id = str(contract_id).replace('/', '_').replace('\\', '_') if contract_id else 'BRAK_ID'
+        safe_pla = str(pla).translate(_FILENAME_TRANS) if pla else 'BRAK_PLA'
+        safe_id = str(contract_id).translate(_FILENAME_TRANS) if contract_id else 'BRAK_ID'
 
         if lokalizacja:
             # Typ B: PLA_ID_2026_Q1_ZAMAWIAJACY.pdf
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""generate_pdf_batch – N raportów w jednym pliku PDF."""
+
+import os
+import re
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    import main
+except NameError as e:      # HANA_CONFIG z placeholderami (np. 'port': port)
+    raise unittest.SkipTest(f"main.py: uzupełnij HANA_CONFIG ({e})")
+
+# Obiekt strony w PDF ReportLab (bez drzewa /Pages)
+_RE_PAGE = re.compile(rb'/Type /Page\b(?!s)')
+
+
+def _payload(i: int, rows: int) -> dict:
+    return {
+        'client_name': f"Klient {i}",
+        'summary_title': "Podsumowanie",
+        'summary_data': [["Nr umowy", f"UM-{i}"], ["Typ", "A"]],
+        'tables': [{
+            'title': "Wykonanie",
+            'headers': ["Sklep", "Kwota", "Udział"],
+            'data': [[f"Sklep {r}", f"{r * 100.5:.2f}", f"{r % 10}.5"]
+                     for r in range(rows)],
+            'currency_columns': [1],
+            'percentage_columns': [2],
+        }],
+    }
+
+
+def _pages(path: str) -> int:
+    with open(path, 'rb') as f:
+        return len(_RE_PAGE.findall(f.read()))
+
+
+class GeneratePdfBatchTest(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self._base = main.BASE_OUTPUT_DIR
+        main.BASE_OUTPUT_DIR = self._tmp.name
+        main._folder_cache.clear()
+
+    def tearDown(self):
+        main.BASE_OUTPUT_DIR = self._base
+        main._folder_cache.clear()
+        self._tmp.cleanup()
+
+    def test_reports_in_one_file_each_from_new_page(self):
+        reports = [_payload(i, rows) for i, rows in enumerate((3, 80, 5))]
+        single = [
+            _pages(main.generate_pdf(filename=f"r{i}.pdf", **r))
+            for i, r in enumerate(reports)
+        ]
+        path = main.generate_pdf_batch(reports, filename="zbiorczy.pdf")
+
+        self.assertTrue(os.path.isfile(path))
+        self.assertEqual(os.path.basename(path), "zbiorczy.pdf")
+        # PageBreak między raportami – strony sumują się jak dla osobnych plików
+        self.assertEqual(_pages(path), sum(single))
+
+    def test_empty_batch(self):
+        path = main.generate_pdf_batch([], filename="pusty.pdf")
+        self.assertTrue(os.path.isfile(path))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""QueryCache – budżet pamięci obejmuje wyniki CALL per (nr, lok)."""
+
+import os
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    import report_factory
+except NameError as e:      # main.py: HANA_CONFIG z placeholderami (np. 'port': port)
+    raise unittest.SkipTest(f"main.py: uzupełnij HANA_CONFIG ({e})")
+from mock_hana import MockConnection
+
+CALL = "CALL SCHEMA.PROC_SKLEPY_WYKONANIE_A_X({nr})"
+NRS = [f"UM-2026-{i:03d}" for i in range(200)]
+BUDGET = 64 * 1024
+
+
+class QueryCacheCallBudgetTest(unittest.TestCase):
+
+    def _cache(self, pool_size: int = 1) -> "report_factory.QueryCache":
+        pool = report_factory.HanaPool(
+            connections=[MockConnection() for _ in range(pool_size)])
+        return report_factory.QueryCache(pool)
+
+    def _assert_within_budget(self, cache):
+        self.assertEqual(cache._cache_total, sum(cache._cache_bytes.values()))
+        self.assertLessEqual(cache._cache_total, BUDGET)
+        self.assertGreater(cache._evicted, 0)
+
+    def test_prefetch_calls_past_budget(self):
+        # Równolegle na 3 połączeniach – zapis do LRU z wielu wątków
+        cache = self._cache(pool_size=3)
+        with mock.patch.object(report_factory, 'BATCH_CACHE_MAX_BYTES', BUDGET):
+            cache.prefetch([CALL], {CALL: {(nr, None) for nr in NRS}})
+            self._assert_within_budget(cache)
+            self.assertEqual(cache.query_count, len(NRS))
+
+            # Wyrzucony wynik – get() pyta bazę ponownie, budżet dalej trzymany
+            evicted = next(nr for nr in NRS
+                           if cache._call_key(CALL, nr) not in cache._cache)
+            self.assertTrue(cache.get(CALL, nr=evicted))
+            self.assertEqual(cache.query_count, len(NRS) + 1)
+            self._assert_within_budget(cache)
+
+    def test_get_calls_past_budget(self):
+        cache = self._cache()
+        with mock.patch.object(report_factory, 'BATCH_CACHE_MAX_BYTES', BUDGET):
+            for nr in NRS:
+                cache.get(CALL, nr=nr)
+            self._assert_within_budget(cache)
+
+            # Trafienie odświeża wpis – ostatnio czytany nie wypada pierwszy
+            key = cache._call_key(CALL, NRS[-2])
+            cache.get(CALL, nr=NRS[-2])
+            self.assertEqual(next(reversed(cache._cache)), key)
+            self.assertEqual(cache.query_count, len(NRS))
+
+
+if __name__ == '__main__':
+    unittest.main()